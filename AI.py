@@ -5,19 +5,30 @@
 #  -"medium" is minimax implemented (w/ alpha beta pruning), using AI scoring criteria
 
 import time
-import math
 import random
+import multiprocessing
 from pieces import *
 from board import Board, NoKingError, InvalidBoardMoveError
+from evaluation import piece_worth
 from profiler import Profiler
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from move_ordering import MoveOrderer
+from time_manager import TimeManager, SearchTimeout
+from search_stats import SearchStats
+import batch_eval
+from playout import Playout
+from mcts_tree import MCTSTree, root_node
+import tree_parallel
 
 
 class AI:
 
-    def __init__(self, color: int):
+    def __init__(self, color: int, tt_size_mb: float = 16, time_manager: TimeManager = None):
         self._team = color
-        self.zob_hashing = {}
-        self.transpositions = 0
+        # search results, keyed by zobrist hash (tt_size_mb None for a subclass that brings its own table)
+        self.tt = TranspositionTable(tt_size_mb) if tt_size_mb is not None else None
+        self.time_manager = time_manager  # the AI's game clock, None to play without a clock
+        self.book = None  # opening book (see opening_book.py), None to always search
 
     @Profiler.profile
     def scoring(self, board: Board, color: int) -> int:
@@ -26,11 +37,6 @@ class AI:
         :param board: The board (represented as an 8x8 list of lists containing piece objects)
         :param color: The team of the side in question
         :return: A generalized score (int) for the difference in total piece worth for each side."""
-        zob = board.get_zobrist_hash()
-        if zob in self.zob_hashing.keys():
-            self.transpositions += 1
-            return self.zob_hashing[zob]
-
         try:
             if board.checkmate():
                 # large negative if AI team in checkmate, positive otherwise
@@ -40,35 +46,8 @@ class AI:
             print(board)
             pass
 
-        scores = []  # [AI score, other team score]
-        num_moves = board.get_current_move_count()
-        for team in [1, -1]:
-            consider = board.get_pieces_left(color * team)  # pieces left for AI, then pieces left for other team
-
-            worth_weights = []  # initial weighting: get the difference in worth for each team
-            constant_dev = []  # development of pieces that should stay the same throughout the game
-            diminishing_dev = []  # development of pieces that should become less important as game goes on
-            piece_development = []  # general piece development: increase weight if pieces have many options to move
-
-            for p in consider:
-                x, y = consider[p]
-                if isinstance(p, Pawn) or isinstance(p, Knight):  # diminish importance as game goes on
-                    diminishing_dev.append(p.eval[y][x])
-                else:
-                    constant_dev.append(p.eval[y][x])
-
-                if not isinstance(p, Pawn):
-                    piece_development.append(len(p.legal_moves()) * p.get_worth() / 100)
-                worth_weights.append(p.get_worth())
-
-            score = sum(worth_weights)
-            score += sum(diminishing_dev) + (sum(constant_dev))
-            # score += (sum(diminishing_dev) / num_moves) + (sum(constant_dev))
-            # score += 15 * sum(piece_development)
-            scores.append(score)
-
-        score = scores[0] - scores[1]
-        self.zob_hashing[zob] = score
+        # worth and piece development (piece-square tables) of each team, kept up to date by the board on every move
+        score = board.evaluate(color)
         return score  # AI score - other score
 
     def get_team(self):
@@ -92,9 +71,23 @@ class AI:
         :return: A tuple with chess letter notation as position"""
         return chr(position[0] + 65), position[1] + 1  # a tuple
 
+    def play_book_move(self, board: Board) -> bool:
+        """Make a weighted choice of a move from the opening book and make the move, if the book has one for the
+        position (called first by make_move: book moves take no search)
+        :return: True if a book move was made"""
+        move = None if self.book is None else self.book.choose(board)
+        if move is None:
+            return False
+        board.move_piece(move[0], move[1])
+        print(f"book move from {move[0]} to {move[1]}")
+        print(board)
+        return True
+
     @Profiler.profile
     def make_move(self, board: Board):
         """Choose (make a weighted choice) a move for the AI to make and make the move. Takes as input a board object"""
+        if self.play_book_move(board):
+            return
         moves_dict = {m: 1 for m in self.format_legal_moves(board)}
         lis = [e for e in list(moves_dict.items())]
         moves, weights = [elem[0] for elem in lis], [elem[1] for elem in lis]
@@ -108,174 +101,321 @@ class AI:
 
 class MinimaxAI(AI):
 
-    def __init__(self, color: int):
-        super().__init__(color)
+    def __init__(self, color: int, tt_size_mb: float = 16, time_manager: TimeManager = None):
+        super().__init__(color, tt_size_mb, time_manager)
         self.alpha = -1 * float('inf')
         self.beta = float('inf')
         self.max_depth = 4
+        self.max_quiescence_depth = 8  # the most captures searched past the leaves of the main search
+        self.delta_margin = 200  # delta pruning: skip captures that can't raise the score to alpha even with this bonus
+        self.orderer = MoveOrderer()  # killer moves and history table
+        self.null_move = True  # null move pruning
+        self.null_move_reduction = 2  # how much shallower than a real move a null move is searched
+        # late move reductions: quiet moves after the first lmr_min_moves are searched lmr_reduction plies shallower
+        self.lmr = True
+        self.lmr_min_depth = 3  # only reduce with at least this depth left
+        self.lmr_min_moves = 3
+        self.lmr_reduction = 1
+        # futility pruning: with depth d < len(futility_margins) left, skip the quiet moves if the static score plus
+        # futility_margins[d] can't reach alpha (beta for the minimizing side)
+        self.futility = True
+        self.futility_margins = [0, 200, 500]
+        # reverse futility pruning: with depth d <= reverse_futility_depth left, cut off if the static score minus
+        # d * reverse_futility_margin still beats beta (alpha for the minimizing side)
+        self.reverse_futility = True
+        self.reverse_futility_depth = 3
+        self.reverse_futility_margin = 120
+        self.stats = SearchStats()  # node, cutoff, pruning and reduction counts of the current search
 
     @Profiler.profile
-    def minimax(self, board: Board, depth: int, alpha: float, beta: float, maximizing_player: bool):
-        """Implement minimax algorithm: the best move for the maximizing color looking ahead depth moves on the board
+    def minimax(self, board: Board, depth: int, alpha: float, beta: float, maximizing_player: bool, ply: int = 0,
+                allow_null: bool = True):
+        """Implement minimax algorithm: the best move for the maximizing color looking ahead depth moves on the board.
+        Principal variation search: after the first move, each move is searched with a zero window to prove it is no
+        better than the best so far, and only searched again with the full window if it is.
         :param board: The current board being evaluated
         :param depth: The current depth being evaluated
         :param alpha: value for alpha
         :param beta: value for beta
         :param maximizing_player: bool representing whether the AI's team is maximizing their score at the current depth
+        :param ply: The number of moves from the root of the search
+        :param allow_null: whether a null move can be tried (not right after another null move)
         :return: A tuple with best move and best evaluation"""
-        # base case: depth = 0
-        if depth == 0 or board.is_game_over():
+        if self.time_manager is not None:
+            self.time_manager.check()  # raises SearchTimeout when the time for the move is up
+
+        # base case: depth = 0, search captures until the position is quiet
+        if depth == 0:
+            return None, self.quiescence(board, alpha, beta, maximizing_player)
+        if board.is_game_over():
             return None, self.scoring(board, self._team)
+        self.stats.nodes += 1
 
-        moves = self.format_legal_moves(board)[::-1]
+        # use the transposition table: cut off if the position was searched deep enough, and try its best move first
+        zob = board.get_zobrist_hash()
+        alpha_orig, beta_orig = alpha, beta
+        entry = self.tt.probe(zob)
+        tt_move = None
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            if tt_depth >= depth and tt_move is not None:
+                if tt_bound == EXACT:
+                    self.stats.tt_cutoffs += 1
+                    return tt_move, tt_score
+                elif tt_bound == LOWER_BOUND:
+                    alpha = max(alpha, tt_score)
+                else:  # UPPER_BOUND
+                    beta = min(beta, tt_score)
+                if beta <= alpha:
+                    self.stats.tt_cutoffs += 1
+                    return tt_move, tt_score
+
+        turn = board.get_current_turn()
+        in_check = board.is_in_check(turn)
+
+        # reverse futility pruning: near the leaves, cut off if the static score beats the bound by a margin per ply
+        # left, in zero window searches only
+        static_eval = None
+        if ply > 0 and not in_check and (depth <= self.reverse_futility_depth or depth < len(self.futility_margins)):
+            static_eval = self.scoring(board, self._team)
+            margin = self.reverse_futility_margin * depth
+            if (self.reverse_futility and depth <= self.reverse_futility_depth and beta - alpha == 1 and
+                    ((static_eval - margin >= beta) if maximizing_player else (static_eval + margin <= alpha))):
+                self.stats.reverse_futility_pruned += 1
+                return None, static_eval
+
+        # null move pruning: if the score still fails high (low for the minimizing side) after passing the turn, a real
+        # move would too. Not when in check (passing would be illegal) or with only pawns left (zugzwang is common)
+        bound = beta if maximizing_player else alpha
+        if (self.null_move and allow_null and ply > 0 and depth > self.null_move_reduction and abs(bound) != float('inf')
+                and board.has_non_pawn_material(turn) and not in_check):
+            board.make_null_move()
+            null_depth = depth - 1 - self.null_move_reduction
+            if maximizing_player:
+                null_eval = self.minimax(board, null_depth, beta - 1, beta, False, ply + 1, False)[1]
+            else:
+                null_eval = self.minimax(board, null_depth, alpha, alpha + 1, True, ply + 1, False)[1]
+            board.undo_null_move()
+            if (null_eval >= beta) if maximizing_player else (null_eval <= alpha):
+                self.stats.null_cutoffs += 1
+                return None, bound
+
+        # futility pruning: near the leaves, quiet moves can't bring a static score far below the bound up to it
+        futile = (self.futility and static_eval is not None and depth < len(self.futility_margins) and
+                  ((static_eval + self.futility_margins[depth] <= alpha) if maximizing_player
+                   else (static_eval - self.futility_margins[depth] >= beta)))
+        reduce = self.lmr and depth >= self.lmr_min_depth and not in_check
+        killers = self.orderer.killers[ply] if ply < self.orderer.max_ply else []
+
+        # transposition table move, captures (MVV-LVA), killer moves, then quiet moves by history score
+        moves = self.orderer.order_moves(board, self.format_legal_moves(board), ply, tt_move)
         best_move = moves[0]
+        best_eval = -1 * float('inf') if maximizing_player else float('inf')
+        for i, move in enumerate(moves):
+            # late quiet moves (not captures, promotions or checks) can be pruned or reduced
+            quiet = i > 0 and (futile or reduce) and self.orderer.mvv_lva(board, move) == 0
+            board.move_piece(move[0], move[1], check=False)  # make the move on the board
+            quiet = quiet and not board.is_in_check(-turn)
+
+            if quiet and futile:
+                board.undo_move()
+                self.stats.futility_pruned += 1
+                continue
 
-        if maximizing_player:
-            max_eval = -1 * float('inf')
-            for move in moves:
-                board.move_piece(move[0], move[1], check=False)  # make the move on the board
-
-                # make a recursive call to minimax to find the best evaluation at a specified depth
-                curr_eval = self.minimax(board, depth - 1, alpha, beta, False)[1]
+            # make a recursive call to minimax to find the best evaluation at a specified depth
+            reduction = self.lmr_reduction if quiet and reduce and i >= self.lmr_min_moves and move not in killers else 0
+            curr_eval = self._search_move(board, depth, alpha, beta, maximizing_player, ply, i == 0, reduction)
 
-                board.undo_move()  # unmake the move on the board
+            board.undo_move()  # unmake the move on the board
 
-                if curr_eval > max_eval:
-                    max_eval = curr_eval
+            if maximizing_player:
+                if curr_eval > best_eval:
+                    best_eval = curr_eval
                     best_move = move
-
                 alpha = max(alpha, curr_eval)
+            else:
+                if curr_eval < best_eval:
+                    best_eval = curr_eval
+                    best_move = move
+                beta = min(beta, curr_eval)
 
-                if beta <= alpha:
-                    break
-            return best_move, max_eval
+            if beta <= alpha:
+                self.stats.cutoffs += 1
+                if i == 0:
+                    self.stats.first_move_cutoffs += 1
+                self.orderer.update(board, move, depth, ply)
+                break
+        self.store_result(zob, depth, best_eval, alpha_orig, beta_orig, best_move)
+        return best_move, best_eval
+
+    def _search_move(self, board: Board, depth: int, alpha: float, beta: float, maximizing_player: bool, ply: int,
+                     first: bool, reduction: int) -> float:
+        """Search a move that was just made on the board. The first move is searched with the full window. Later moves
+        are searched with a zero window around alpha (beta for the minimizing side) and reduction plies shallower; a
+        reduced move that beats the bound is searched again to the full depth, and one that is inside the window is
+        searched again with the full window.
+        :param board: The board the move was made on
+        :param depth: The depth left before the move
+        :param alpha: value for alpha
+        :param beta: value for beta
+        :param maximizing_player: whether the team that made the move is maximizing its score
+        :param ply: The number of moves from the root of the search before the move
+        :param first: whether the move is the first move searched
+        :param reduction: The number of plies to reduce the search by (0 for none)
+        :return: The evaluation of the move"""
+        child = not maximizing_player
+        if first:
+            return self.minimax(board, depth - 1, alpha, beta, child, ply + 1)[1]
+
+        low, high = (alpha, alpha + 1) if maximizing_player else (beta - 1, beta)
+        if reduction:
+            self.stats.reductions += 1
+            curr_eval = self.minimax(board, depth - 1 - reduction, low, high, child, ply + 1)[1]
+            if (curr_eval <= alpha) if maximizing_player else (curr_eval >= beta):
+                return curr_eval
+            self.stats.reduction_re_searches += 1
+
+        curr_eval = self.minimax(board, depth - 1, low, high, child, ply + 1)[1]
+        if alpha < curr_eval < beta:  # better than the best move so far, find its score with the full window
+            self.stats.pvs_re_searches += 1
+            curr_eval = self.minimax(board, depth - 1, alpha, beta, child, ply + 1)[1]
+        return curr_eval
 
+    @Profiler.profile
+    def quiescence(self, board: Board, alpha: float, beta: float, maximizing_player: bool, depth: int = 0):
+        """Quiescence search: from a leaf of the minimax search, search only captures and promotions until the position
+        is quiet, so a leaf isn't scored in the middle of an exchange (horizon effect). The side to move can always
+        decline to capture, so the static score (stand pat) is a bound on the score. When in check every move is
+        searched, since standing pat isn't possible.
+        :param board: The current board being evaluated
+        :param alpha: value for alpha
+        :param beta: value for beta
+        :param maximizing_player: bool representing whether the AI's team is the one to move
+        :param depth: The number of moves made since the leaf
+        :return: The evaluation of the position"""
+        if self.time_manager is not None:
+            self.time_manager.check()
+        self.stats.quiescence_nodes += 1
+
+        stand_pat = self.scoring(board, self._team)
+        if depth >= self.max_quiescence_depth or abs(stand_pat) == 999999:  # depth limit or checkmate
+            return stand_pat
+
+        in_check = board.is_in_check(board.get_current_turn())
+        if in_check:
+            moves = self.format_legal_moves(board)
+            best = -1 * float('inf') if maximizing_player else float('inf')
         else:
-            min_eval = float('inf')
-            for move in moves:
-                board.move_piece(move[0], move[1], check=False)  # make the move on the board
-
-                # make a recursive call to minimax to find the best evaluation at a specified depth
-                curr_eval = self.minimax(board, depth - 1, alpha, beta, True)[1]
-
-                board.undo_move()  # unmake the move on the board
-
-                if curr_eval < min_eval:
-                    min_eval = curr_eval
-                    best_move = move
+            if maximizing_player:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+            moves = board.legal_captures()
+            best = stand_pat
+
+        for pos1, pos2 in moves:
+            # delta pruning: skip captures (not promotions) that can't bring the score inside the window, even with a
+            # margin for the positional gain
+            if not in_check and not (isinstance(board.get_piece_from_position(pos1), Pawn) and pos2[1] in (0, 7)):
+                gain = piece_worth[board.get_piece_from_position(pos2).get_idx()] + self.delta_margin
+                if stand_pat + gain <= alpha if maximizing_player else stand_pat - gain >= beta:
+                    continue
+
+            board.move_piece(pos1, pos2, check=False)
+            curr_eval = self.quiescence(board, alpha, beta, not maximizing_player, depth + 1)
+            board.undo_move()
 
+            if maximizing_player:
+                best = max(best, curr_eval)
+                alpha = max(alpha, curr_eval)
+            else:
+                best = min(best, curr_eval)
                 beta = min(beta, curr_eval)
-
-                if beta <= alpha:
-                    break
-            return best_move, min_eval
+            if beta <= alpha:
+                break
+        return best
+
+    def store_result(self, zob: int, depth: int, score, alpha, beta, best_move):
+        """Store a search result in the transposition table, with its bound type given the original alpha-beta window
+        :param zob: The zobrist hash of the position
+        :param depth: The depth searched
+        :param score: The score found
+        :param alpha: The value of alpha when the search of the position started
+        :param beta: The value of beta when the search of the position started
+        :param best_move: The best move found"""
+        if score <= alpha:
+            bound = UPPER_BOUND
+        elif score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(zob, depth, score, bound, best_move)
 
     @Profiler.profile
     def make_move(self, board: Board):
         """Choose a move for the AI to make and make the move. Takes as input a board object"""
-        start_pos, end_pos = self.minimax(board, self.max_depth, self.alpha, self.beta, True)[0]  # minimax
-        print('t', self.transpositions)
-        print('h', len(self.zob_hashing))
+        if self.play_book_move(board):
+            return
+        self.tt.new_search()
+        self.orderer.new_search()
+        self.stats.reset()
+        start = time.time()
+        move_count = board.get_current_move_count()
+        if self.time_manager is not None:
+            self.time_manager.start(move_count)
+        try:
+            start_pos, end_pos = self.minimax(board, self.max_depth, self.alpha, self.beta, True)[0]  # minimax
+        except SearchTimeout:  # out of time before the search finished
+            while board.get_current_move_count() > move_count:  # unmake the moves of the aborted search
+                board.undo_move()
+            # the best move stored for the position in the transposition table, else the best ordered move
+            moves = self.format_legal_moves(board)
+            entry = self.tt.probe(board.get_zobrist_hash())
+            if entry is not None and entry[3] in moves:
+                start_pos, end_pos = entry[3]
+            else:
+                start_pos, end_pos = self.orderer.order_moves(board, moves, 0)[0]
+        if self.time_manager is not None:
+            self.time_manager.stop()
+        self.stats.report(time.time() - start)
+        print('t', self.tt.hits)
+        print('h', len(self.tt))
         board.move_piece(start_pos, end_pos)  # move piece on the board
         print(f"moving from {start_pos} to {end_pos}")
         print(board)
 
 
-class Node:
-
-    def __init__(self, board: Board, last_move, parent, first_move):
-        # total = wins;  score = total / visits
-        self.board = board
-        self.move = last_move  # move from parent to node
-        self.parent = parent  # parent node
-        self.children = []  # list of child nodes
-        self.total = 0
-        self.visits = 0
-        self.depth = 0
-        self.samples = []
-        self.first_move = first_move  # initial move
-
-        if parent is not None:
-            self.depth = parent.depth + 1
-
-    def is_leaf_node(self):
-        return len(self.children) == 0
-
-    def select_node(self):
-        """Choose a node using the selection policy formula"""
-        c = 400
-        lis = []
-        for n in self.children:
-            if n.visits == 0:
-                s = float('inf')
-            else:
-                s = (n.total / n.visits) + (c * ((math.log(self.visits) / n.visits) ** 0.5))
-            lis.append((n, s))
-
-        v = max([e[1] for e in lis])
-        best = [nd for nd, val in lis if val == v]
-        child = random.choice(best)
-        return child
-
-    def expand_node(self):
-        if self.depth > 2:
-            return self
-
-        board = self.board
-        for move in AI.format_legal_moves(board):
-            board.move_piece(move[0], move[1])
-            if self.parent is None:  # is the root node
-                self.children.append(Node(board, move, self, move))
-            else:
-                self.children.append(Node(board, move, self, self.first_move))
-            board.undo_move()
-
-        return random.choice(self.children)  # random node
-
-    def simulation(self, t, team):
-        """Run a simulation, return a resulting score"""
-        i = 0  # limit the depth of the simulation (going further doesn't really give any information)
-        while (not self.board.is_game_over()) and (i < 5):
-            # random move on the board
-            moves = AI.format_legal_moves(self.board)
-            move = random.choice(moves)
-
-            # make move on the board
-            self.board.move_piece(move[0], move[1])
-            i += 1
-
-        w = MCTSAI(1).scoring(self.board, team)
-
-        for _ in range(i):
-            self.board.undo_move()
-        self.board._legal_moves = {}
-
-        return w
-
-    def backpropogate(self, result):
-        self.visits += 1
-        self.total += result
-        self.samples.append(result)
-
-        if self.parent is not None:
-            self.parent.backpropogate(result)
-
-
 class MCTSAI(AI):
 
+    def __init__(self, color: int, tt_size_mb: float = 16, time_manager: TimeManager = None, num_workers: int = 1):
+        super().__init__(color, tt_size_mb, time_manager)
+        self.num_workers = num_workers  # processes that each build an independent tree, 1 to search in this process
+        self.shared_tree = False  # whether the workers grow one shared tree instead (see tree_parallel.py)
+        self.virtual_loss = 500  # steers tree-parallel workers away from the branches other workers are searching
+        self.batch_size = 1  # simulations run from each leaf and evaluated together with NumPy (1 for no batching)
+        self.playout = Playout()  # the simulation engine, reused for every simulation
+        self.max_nodes = 200000  # the largest tree kept in memory, the least visited branches are cut beyond it
+        self.tree = None  # the tree under the AI's last move, kept for the next search (see reuse_tree)
+        self._root_move_count = None  # move count of the root's position
+
     @staticmethod
-    def best_board(node):
-        """Best action"""
+    def best_board(tree: MCTSTree):
+        """Best action: the child of the root with the best average result"""
         counter = {}
         s = 0
-        for n in node.children:
-            if len(n.samples) == 0:
+        for child in tree.children(root_node):
+            visits = tree.visits[child]
+            if visits == 0:
                 sample = 0
             else:
-                sample = sum(n.samples) / len(n.samples)  # [sample] = [n.total / n.visits]
-            counter[n.move] = sample
-            print('d', n.move, sample, len(n.samples))
-            s += len(n.samples)
+                sample = tree.totals[child] / visits
+            counter[tree.moves[child]] = sample
+            print('d', tree.moves[child], sample, visits)
+            s += visits
         print('s', s)
 
         lis = counter.items()
@@ -285,140 +425,239 @@ class MCTSAI(AI):
 
     def mcts(self, board: Board):
         start = time.time()
-        root = Node(board, None, None, None)
-        root.expand_node()
+        # search for the move's time budget when playing with a clock, 5 seconds otherwise
+        budget = 5 if self.time_manager is None else self.time_manager.start(board.get_current_move_count())
+        if self.num_workers > 1 and not self.shared_tree:
+            tree = self.parallel_mcts(board, start + budget)
+        else:
+            tree = self.search_tree(board, start + budget, self.reuse_tree(board))
+            self.tree = tree  # until the move is made (see keep_tree)
+        if self.time_manager is not None:
+            self.time_manager.stop()
+        return self.best_board(tree)
+
+    def reuse_tree(self, board: Board):
+        """Find the part of the last search's tree that is still valid: the subtree under the opponent's reply to the
+        AI's last move
+        :param board: The board to search
+        :return: The tree with the subtree as its root, or None if there is none to reuse"""
+        tree, self.tree = self.tree, None
+        if tree is None or board.get_current_move_count() != self._root_move_count + 1:
+            return None
+        child = tree.find_child(root_node, board.get_last_move())
+        if child == -1:
+            return None
+        tree.make_root(child)
+        return tree
+
+    def keep_tree(self, move, board: Board):
+        """Keep the subtree under the move made by the AI for the next search
+        :param move: The move made
+        :param board: The board (after the move)"""
+        tree, self.tree = self.tree, None
+        if tree is None:
+            return
+        child = tree.find_child(root_node, move)
+        if child != -1 and not tree.is_leaf(child):
+            tree.make_root(child)
+            self.tree = tree
+            self._root_move_count = board.get_current_move_count()
+
+    def simulation(self, board: Board):
+        """Run a simulation from the board's position
+        :return: The resulting score"""
+        return self.playout.run(board.snapshot(), self._team)
+
+    def batch_simulation(self, board: Board, count: int):
+        """Run count simulations from the board's position and score their final positions together with the batch
+        evaluator (checkmates are scored as in AI.scoring)
+        :return: The total of the resulting scores"""
+        snapshot = board.snapshot()
+        total = 0
+        positions = []  # final positions to evaluate
+        for _ in range(count):
+            turn, mated = self.playout.play(snapshot)
+            if mated:
+                total += -999999 * turn * self._team
+            else:
+                positions.append(self.playout.position())
+
+        if positions:
+            total += int(batch_eval.evaluate_batch(positions, self._team).sum())
+        return total
+
+    def search_tree(self, board: Board, deadline: float, tree: MCTSTree = None):
+        """Build a search tree from the current position until the deadline
+        :param board: The board to search
+        :param deadline: The time (time.time()) to stop searching
+        :param tree: A tree kept from the last search (see reuse_tree), None to start a new tree
+        :return: The tree"""
+        if tree is None:
+            tree = MCTSTree()
+        if tree.is_leaf(root_node):
+            tree.expand(root_node, self.format_legal_moves(board))
+        if self.num_workers > 1 and self.shared_tree:  # tree parallelization: the workers grow the tree together
+            print(tree_parallel.search(tree, board, self._team, deadline, self.num_workers, self.virtual_loss))
+            if len(tree) > self.max_nodes:  # nodes can't be renumbered while workers are searching, cut them after
+                tree.prune(self.max_nodes // 2)
+            return tree
+        batch = self.batch_size > 1 and batch_eval.numpy_available  # several simulations evaluated in one batch
         i = 0
-        while time.time() - start < 5:  # 0.9 seconds
-            n = root
-            #print('4', time.time() - start)
-            while not n.is_leaf_node():
-                n = n.select_node()
-            #print('5', time.time() - start)
-            if n.visits != 0:  # if leaf node not visited yet, then expand it
-                n = n.expand_node()
-            #print('6', time.time() - start)
-            result = n.simulation(start, self._team)
-            #print('7', time.time() - start)
-            n.backpropogate(result)
+        while time.time() < deadline:
+            # selection: walk down the tree, making the move of each node on the board
+            n = root_node
+            while not tree.is_leaf(n):
+                n = tree.select(n)
+                move = tree.moves[n]
+                board.move_piece(move[0], move[1], check=False)
+            if tree.visits[n] != 0:  # if leaf node not visited yet, then expand it
+                child = tree.expand(n, self.format_legal_moves(board))
+                if child != n:
+                    move = tree.moves[child]
+                    board.move_piece(move[0], move[1], check=False)
+                    n = child
+            if batch:
+                tree.backpropagate(n, self.batch_simulation(board, self.batch_size), self.batch_size)
+            else:
+                tree.backpropagate(n, self.simulation(board))
+            for _ in range(tree.depths[n]):  # back to the root position
+                board.undo_move()
+            if len(tree) > self.max_nodes:  # keep memory flat: cut the least visited branches
+                tree.prune(self.max_nodes // 2)
             i += 1
         print(i)
-        return self.best_board(root)
+        return tree
+
+    def parallel_mcts(self, board: Board, deadline: float):
+        """Root parallelization: each worker process builds an independent tree from its own copy of the board until
+        the deadline, then the visits and totals of the children of their roots are added up
+        :param board: The board to search
+        :param deadline: The time (time.time()) to stop searching
+        :return: A tree whose root's children hold the merged visits and totals"""
+        args = [(type(board), board.snapshot(), self._team, deadline, random.getrandbits(32), self.batch_size)
+                for _ in range(self.num_workers)]
+        with multiprocessing.Pool(self.num_workers) as pool:
+            trees = pool.starmap(mcts_worker, args)
+
+        merged = {}  # {key=move, val=[visits, total]}
+        for stats in trees:
+            for move, (visits, total) in stats.items():
+                merged_stats = merged.setdefault(move, [0, 0])
+                merged_stats[0] += visits
+                merged_stats[1] += total
+
+        tree = MCTSTree()
+        tree.expand(root_node, list(merged))
+        for child in tree.children(root_node):
+            visits, total = merged[tree.moves[child]]
+            tree.visits[child], tree.totals[child] = visits, total
+            tree.visits[root_node] += visits
+            tree.totals[root_node] += total
+        return tree
 
     @Profiler.profile
     def make_move(self, board: Board):
         """Choose (make a weighted choice) a move for the AI to make and make the move. Takes as input a board object"""
+        if self.play_book_move(board):
+            self.tree = None
+            return
         start_pos, end_pos = self.mcts(board)
         board.move_piece(start_pos, end_pos)  # move using chess letter notation
+        self.keep_tree((start_pos, end_pos), board)
         print(f"moving from {start_pos} to {end_pos}")
         print(board)
 
 
+def mcts_worker(board_type, snapshot: bytes, team: int, deadline: float, seed: int, batch_size: int = 1) -> dict:
+    """Build an MCTS tree in a worker process (see MCTSAI.parallel_mcts)
+    :param board_type: Board or BitBoard
+    :param snapshot: The position to search (Board.snapshot())
+    :param team: The team of the AI
+    :param deadline: The time (time.time()) to stop searching
+    :param seed: The seed for the random choices of the worker, so each worker builds a different tree
+    :param batch_size: The number of simulations run from each leaf (see MCTSAI.batch_size)
+    :return: {key=move, val=(visits, total)} for the children of the root"""
+    random.seed(seed)
+    board = board_type()
+    board.restore(snapshot)
+    ai = MCTSAI(team)
+    ai.batch_size = batch_size
+    return ai.search_tree(board, deadline).root_stats()
+
+
 class IterativeDeepeningAI(MinimaxAI):
 
-    def __init__(self, color: int):
-        super().__init__(color)
-        self.max_depth = 4
-        self.move_ordering = {}
+    def __init__(self, color: int, tt_size_mb: float = 16, time_manager: TimeManager = None):
+        super().__init__(color, tt_size_mb, time_manager)
+        self.max_depth = 4  # the depth searched to without a clock, the deepest depth with one is max_time_depth
+        self.max_time_depth = 64
+        self.aspiration_window = 50  # half width of the first alpha-beta window around the last iteration's score
 
     def ids(self, board: Board, depth: int):
-        """Run iterative deepening search on a board to a specified depth"""
-        self.move_ordering = {}
+        """Run iterative deepening search on a board to a specified depth. Each iteration stores its results in the
+        transposition table, killer moves and history table, so the next iteration searches the best moves first.
+        Each iteration after the first searches a narrow (aspiration) window around the score of the one before, and
+        searches again with a wider window if the score falls outside of it.
+        With a clock, iterations are only started while there is time to finish them, and a search that runs out of
+        time is aborted: the result of the last completed iteration is returned."""
+        self.tt.new_search()
+        self.orderer.new_search()
+        self.stats.reset()
+        start = time.time()
         print('starting iterations')
 
-        for i in range(1, depth):  # [1, 2, ... depth]
-            self.minimax(board, i, self.alpha, self.beta, True)
-            print('iter depth', i)
-            print('l', len(self.move_ordering))
-            print(self.move_ordering[board.get_zobrist_hash()][::-1][:5])
-
-        result = self.minimax(board, depth, self.alpha, self.beta, True)
-        print('iter depth', depth)
-        print('l', len(self.move_ordering))
-        print(self.move_ordering[board.get_zobrist_hash()][::-1])
+        result = None
+        move_count = board.get_current_move_count()
+        for i in range(1, depth + 1):  # [1, 2, ... depth]
+            if self.time_manager is not None and result is not None and not self.time_manager.can_start_iteration():
+                break
+            try:
+                result = self.aspiration_search(board, i, None if result is None else result[1])
+            except SearchTimeout:
+                while board.get_current_move_count() > move_count:  # unmake the moves of the aborted search
+                    board.undo_move()
+                print('timeout at depth', i)
+                break
+            print('iter depth', i, result)
+
+        if result is None:  # out of time before the first iteration finished
+            result = self.orderer.order_moves(board, self.format_legal_moves(board), 0)[0], 0
+        self.stats.report(time.time() - start)
         return result
 
-    @Profiler.profile
-    def minimax(self, board: Board, depth: int, alpha: float, beta: float, maximizing_player: bool):
-        """Implement minimax algorithm: the best move for the maximizing color looking ahead depth moves on the board
-        :param board: The current board being evaluated
-        :param depth: The current depth being evaluated
-        :param alpha: value for alpha
-        :param beta: value for beta
-        :param maximizing_player: bool representing whether the AI's team is maximizing their score at the current depth
+    def aspiration_search(self, board: Board, depth: int, guess):
+        """Search with a window of self.aspiration_window around a guess of the score, widening it (four times as wide
+        each time) on the side the score falls outside of until it is inside
+        :param board: The board being searched
+        :param depth: The depth to search to
+        :param guess: The expected score (the score of the previous iteration), or None to search the full window
         :return: A tuple with best move and best evaluation"""
-        ordered_moves = []
-        zob = board.get_zobrist_hash()
-
-        if depth == 0 or board.is_game_over():  # base case: depth = 0
-            return None, self.scoring(board, self._team)
-
-        if zob in self.move_ordering.keys():
-            moves = self.move_ordering[zob]
-        else:
-            moves = self.format_legal_moves(board)
-
-        best_move = moves[0]
-
-        if maximizing_player:
-            max_eval = -1 * float('inf')
-            while moves:  # while moves != []
-                move = moves.pop()
-
-                # make the move on the board
-                board.move_piece(move[0], move[1], check=False)
-
-                # make a recursive call to minimax to find the best evaluation at a specified depth
-                curr_eval = self.minimax(board, depth - 1, alpha, beta, False)[1]
-                ordered_moves.append((move, curr_eval))
-
-                # unmake the move on the board
-                board.undo_move()
-
-                if curr_eval > max_eval:
-                    max_eval = curr_eval
-                    best_move = move
-
-                alpha = max(alpha, curr_eval)
-
-                if beta <= alpha:
-                    break
-
-            ordered_moves = sorted(ordered_moves, key=lambda x: x[1])
-            self.move_ordering[zob] = moves + [i[0] for i in ordered_moves]  # worst to best
-            return best_move, max_eval
-
-        else:
-            min_eval = float('inf')
-            while moves:  # moves != []:
-                move = moves.pop()
-                # make the move on the board
-                board.move_piece(move[0], move[1], check=False)
-
-                # make a recursive call to minimax to find the best evaluation at a specified depth
-                curr_eval = self.minimax(board, depth - 1, alpha, beta, True)[1]
-                ordered_moves.append((move, curr_eval))
-
-                # unmake the move on the board
-                board.undo_move()
-
-                if curr_eval < min_eval:
-                    min_eval = curr_eval
-                    best_move = move
-
-                beta = min(beta, curr_eval)
-
-                if beta <= alpha:
-                    break
-
-            ordered_moves = sorted(ordered_moves, key=lambda x: x[1])
-            self.move_ordering[zob] = moves + [i[0] for i in ordered_moves]  # worst to best
-            return best_move, min_eval
+        if guess is None or abs(guess) >= 999999:  # no guess, or checkmate scores
+            return self.minimax(board, depth, self.alpha, self.beta, True)
+
+        delta = self.aspiration_window
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            result = self.minimax(board, depth, alpha, beta, True)
+            if alpha < result[1] < beta:
+                return result
+            delta *= 4
+            if result[1] <= alpha:
+                alpha = result[1] - delta if delta < 999999 else self.alpha
+            else:
+                beta = result[1] + delta if delta < 999999 else self.beta
 
     @Profiler.profile
     def make_move(self, board: Board):
         """Choose (make a weighted choice) a move for the AI to make and make the move. Takes as input a board object"""
-        # start_pos, end_pos = self.ids(board, self.max_depth, self.alpha, self.beta, True, None)
-        start_pos, end_pos = self.ids(board, self.max_depth)[0]  # minimax
+        if self.play_book_move(board):
+            return
+        if self.time_manager is None:
+            start_pos, end_pos = self.ids(board, self.max_depth)[0]
+        else:
+            self.time_manager.start(board.get_current_move_count())
+            start_pos, end_pos = self.ids(board, self.max_time_depth)[0]
+            self.time_manager.stop()
         board.move_piece(start_pos, end_pos)  # move using chess letter notation
         print(f"moving from {start_pos} to {end_pos}")
         print(board)
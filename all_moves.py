@@ -1,5 +1,6 @@
 
 import random
+import struct
 # all_moves.py: meta dictionary storing all the information about all moves from all positions for each piece
 
 # dict = {key=piece_name, value={key=ypos, value={key=xpos, value=[list of possible moves from position]}}}
@@ -10,5 +11,80 @@ all_positions = [(i % 8, i // 8) for i in range(64)]  # [(0, 0), (1, 0), (2, 0),
 # all_positions_fen = [(i % 8, 7 - (i // 8)) for i in range(64)]  # [(0, 7), (1, 7), (2, 7), ..  (5, 0), (6, 0), (7, 0)]
 
 
+# zobrist keys are generated from a fixed seed, so hashes are the same in every process, run and machine. Change
+# zobrist_version whenever the way the keys are generated or laid out changes (saved keys must match to be shared)
+zobrist_version = 2
+zobrist_seed = 0x5EED_C4E55
+zobrist_header = struct.Struct(">4sII")  # saved key files: b"ZOBR", version, number of keys
+
+
+def generate_zobrist_keys(seed: int = zobrist_seed) -> list:
+    """Generate the 781 zobrist keys from a seed: 768 piece-square keys (in zobrist_table order: y, x, piece idx), 4
+    castling keys, 8 en passant file keys and 1 side to move key (781 keys, Polyglot-sized but not Polyglot-compatible)
+    :param seed: The seed of the random number generator
+    :return: A list of 781 non-zero 64-bit keys"""
+    rng = random.Random(seed)
+    keys = []
+    while len(keys) < 781:
+        key = rng.getrandbits(64)
+        if key != 0:
+            keys.append(key)
+    return keys
+
+
+def install_zobrist_keys(keys: list):
+    """Replace the zobrist keys in place (every module that imported the tables sees the new keys). Boards that already
+    exist need zobrist_hash_init() to be called again.
+    :param keys: A list of 781 keys (see generate_zobrist_keys)"""
+    if len(keys) != 781:
+        raise ValueError(f"Expected 781 zobrist keys, got {len(keys)}")
+    for y in range(8):
+        for x in range(8):
+            zobrist_table[y][x][:] = keys[(y * 8 + x) * 12:(y * 8 + x) * 12 + 12]
+    zobrist_castling[:] = keys[768:772]
+    zobrist_en_passant[:] = keys[772:780]
+    zobrist_turn[:] = keys[780:]
+
+
+def get_zobrist_keys() -> list:
+    """:return: The zobrist keys in use, as a list of 781 keys (see generate_zobrist_keys)"""
+    keys = [key for y in range(8) for x in range(8) for key in zobrist_table[y][x]]
+    return keys + zobrist_castling + zobrist_en_passant + zobrist_turn
+
+
+def save_zobrist_keys(path: str):
+    """Save the zobrist keys in use to a binary file: a header (b"ZOBR", version, number of keys), then each key as an
+    unsigned big-endian 64-bit integer"""
+    keys = get_zobrist_keys()
+    with open(path, "wb") as f:
+        f.write(zobrist_header.pack(b"ZOBR", zobrist_version, len(keys)))
+        f.write(struct.pack(f">{len(keys)}Q", *keys))
+
+
+def load_zobrist_keys(path: str, install: bool = True) -> list:
+    """Load zobrist keys saved with save_zobrist_keys
+    :param path: The file to load
+    :param install: Whether to replace the keys in use with the loaded keys
+    :return: The loaded keys"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < zobrist_header.size:
+        raise ValueError(f"{path} is not a version {zobrist_version} zobrist key file")
+    magic, version, n = zobrist_header.unpack_from(data)
+    if magic != b"ZOBR" or version != zobrist_version:
+        raise ValueError(f"{path} is not a version {zobrist_version} zobrist key file")
+    if n != 781 or len(data) != zobrist_header.size + 8 * n:
+        raise ValueError(f"{path} should hold 781 zobrist keys, but its header says {n} and it holds "
+                         f"{(len(data) - zobrist_header.size) // 8}")
+    keys = list(struct.unpack_from(f">{n}Q", data, zobrist_header.size))
+    if install:
+        install_zobrist_keys(keys)
+    return keys
+
+
+_keys = generate_zobrist_keys()
 # table for each piece type indexed by position
-zobrist_table = [[[random.randint(1, 2**64 - 1) for i in range(12)] for j in range(8)] for k in range(8)]
+zobrist_table = [[_keys[(y * 8 + x) * 12:(y * 8 + x) * 12 + 12] for x in range(8)] for y in range(8)]
+zobrist_castling = _keys[768:772]  # white king-side, white queen-side, black king-side, black queen-side
+zobrist_en_passant = _keys[772:780]  # en passant file (unused: the board doesn't support en passant yet)
+zobrist_turn = _keys[780:]  # a single key, folded into the hash when black is to move (a list, to replace in place)
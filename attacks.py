@@ -0,0 +1,111 @@
+# attacks.py: precomputed attack tables for every piece, indexed by square (square = 8 * ypos + xpos)
+
+from all_moves import all_positions
+
+rook_directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+bishop_directions = [(1, 1), (-1, 1), (-1, -1), (1, -1)]
+
+
+def _leaper_table(offsets):
+    """Build a table of attack bitboards indexed by square for a piece that jumps by the given (dx, dy) offsets"""
+    table = []
+    for x, y in all_positions:
+        bb = 0
+        for dx, dy in offsets:
+            if 0 <= x + dx <= 7 and 0 <= y + dy <= 7:
+                bb |= 1 << ((y + dy) * 8 + x + dx)
+        table.append(bb)
+    return table
+
+
+def _ray_attacks(sq, occupied, directions):
+    """Walk each ray from sq square by square, stopping at (and including) the first occupied square"""
+    x, y = all_positions[sq]
+    attacks = 0
+    for dx, dy in directions:
+        i, j = x + dx, y + dy
+        while 0 <= i <= 7 and 0 <= j <= 7:
+            attacks |= 1 << (j * 8 + i)
+            if (occupied >> (j * 8 + i)) & 1:
+                break
+            i, j = i + dx, j + dy
+    return attacks
+
+
+def _relevant_mask(sq, directions):
+    """Squares whose occupancy can change the attacks from sq. The last square of each ray is left out, since it is
+    attacked whether or not there is a piece on it"""
+    x, y = all_positions[sq]
+    mask = 0
+    for dx, dy in directions:
+        i, j = x + dx, y + dy
+        while 0 <= i + dx <= 7 and 0 <= j + dy <= 7:
+            mask |= 1 << (j * 8 + i)
+            i, j = i + dx, j + dy
+    return mask
+
+
+def _between_table():
+    """Build a table indexed by two squares of the squares strictly between them (0 if they don't share a line)"""
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        x, y = all_positions[sq]
+        for dx, dy in rook_directions + bishop_directions:
+            bb = 0
+            i, j = x + dx, y + dy
+            while 0 <= i <= 7 and 0 <= j <= 7:
+                table[sq][j * 8 + i] = bb
+                bb |= 1 << (j * 8 + i)
+                i, j = i + dx, j + dy
+    return table
+
+
+def _slider_tables(directions):
+    """Build the relevant occupancy masks and the attack lookup tables for a sliding piece. The table for each square
+    maps every subset of its mask (the blockers) to the attacked squares. A dictionary keyed by the masked occupancy
+    plays the role of the magic multiplication + shift of C engines, which is slower than a dict lookup in Python."""
+    masks, tables = [], []
+    for sq in range(64):
+        mask = _relevant_mask(sq, directions)
+        table = {}
+        subset = 0
+        while True:  # enumerate every subset of the mask (carry-rippler trick)
+            table[subset] = _ray_attacks(sq, subset, directions)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+knight_attacks = _leaper_table([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+king_attacks = _leaper_table([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+pawn_attacks = [_leaper_table([(1, 1), (-1, 1)]), _leaper_table([(1, -1), (-1, -1)])]  # [white, black]
+
+rook_masks, rook_table = _slider_tables(rook_directions)
+bishop_masks, bishop_table = _slider_tables(bishop_directions)
+between = _between_table()
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    """:return: Bitboard of the squares attacked by a rook on sq, given the bitboard of occupied squares"""
+    return rook_table[sq][occupied & rook_masks[sq]]
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    """:return: Bitboard of the squares attacked by a bishop on sq, given the bitboard of occupied squares"""
+    return bishop_table[sq][occupied & bishop_masks[sq]]
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    """:return: Bitboard of the squares attacked by a queen on sq, given the bitboard of occupied squares"""
+    return rook_table[sq][occupied & rook_masks[sq]] | bishop_table[sq][occupied & bishop_masks[sq]]
+
+
+def squares(bb: int):
+    """Iterate over the squares of the set bits of a bitboard"""
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
@@ -0,0 +1,58 @@
+# batch_eval.py: evaluates many positions at once with NumPy (the same score as Board.evaluate)
+
+#  Positions are Board.to_array() bytes: one byte per square (square = 8 * ypos + xpos) holding the piece index, or 12
+#  for an empty square. A batch is one-hot encoded into a (positions, 12 * 64) matrix, and a single matrix product
+#  with the weights of every piece on every square gives the material, midgame, endgame and phase totals of all of the
+#  positions. The tapered blend is then done for the whole batch with integer arithmetic, like Board.evaluate.
+
+from evaluation import piece_worth, midgame_tables, endgame_tables, phase_weights, phase_scale
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: without it batch evaluation isn't available
+    np = None
+
+numpy_available = np is not None
+empty_square = 12  # the byte of an empty square in Board.to_array()
+
+
+def _build_weights():
+    """Build the (12 * 64, 4) weight matrix: the material, midgame and endgame piece-square values (positive for white,
+    negative for black) and the phase weight of each piece index on each square"""
+    weights = np.zeros((12 * 64, 4), dtype=np.int64)
+    for idx in range(12):
+        sign = 1 if idx % 2 == 0 else -1
+        for sq in range(64):
+            y, x = sq >> 3, sq & 7
+            weights[idx * 64 + sq] = (sign * piece_worth[idx], sign * midgame_tables[idx][y][x],
+                                      sign * endgame_tables[idx][y][x], phase_weights[idx])
+    return weights
+
+
+if numpy_available:
+    weights = _build_weights()
+    scale_table = np.array(phase_scale, dtype=np.int64)
+    piece_indices = np.arange(12, dtype=np.uint8).reshape(1, 12, 1)
+
+
+def encode(positions: list):
+    """Stack positions into an array
+    :param positions: List of Board.to_array() bytes
+    :return: (number of positions, 64) uint8 array of piece indices"""
+    return np.frombuffer(b"".join(positions), dtype=np.uint8).reshape(-1, 64)
+
+
+def evaluate_batch(positions, color: int):
+    """Evaluate a batch of positions, as Board.evaluate(color) would evaluate each of them
+    :param positions: List of Board.to_array() bytes, or an array from encode()
+    :param color: The team of the side in question
+    :return: Array of the scores of the positions (positive if the team is winning)"""
+    if not numpy_available:
+        raise ImportError("batch evaluation needs NumPy (pip install numpy)")
+
+    squares = positions if isinstance(positions, np.ndarray) else encode(positions)
+    one_hot = (squares[:, None, :] == piece_indices).reshape(len(squares), 12 * 64)
+    material, midgame, endgame, phase = (one_hot.astype(np.int64) @ weights).T
+    scale = scale_table[np.minimum(phase, len(scale_table) - 1)]
+    score = material + ((midgame * scale + endgame * (256 - scale)) >> 8)  # >> floors like Board.evaluate's shift
+    return score if color == 1 else -score
@@ -0,0 +1,537 @@
+# bitboard.py: defines the bitboard object, a drop-in alternative to Board that stores the position as integers
+
+from pieces import *
+from typing import Union
+import collections
+from profiler import Profiler
+from all_moves import all_positions, zobrist_table, zobrist_turn, zobrist_castling
+from attacks import knight_attacks, king_attacks, pawn_attacks, rook_attacks, bishop_attacks, squares
+from evaluation import piece_worth, midgame_tables, endgame_tables, phase_weights, phase_scale
+from board import NoKingError, InvalidBoardMoveError, parse_fen
+
+# piece class for each piece index (matches Piece.get_idx(): even indices are white, odd indices are black)
+piece_types = [Pawn, Pawn, Knight, Knight, Bishop, Bishop, Rook, Rook, Queen, Queen, King, King]
+
+full_board = 2**64 - 1
+
+# castling rights: 1 = white king-side, 2 = white queen-side, 4 = black king-side, 8 = black queen-side
+# rights that survive a move touching each square (moving the king or a rook, or capturing a rook, loses rights)
+castling_mask = [15] * 64
+castling_mask[4], castling_mask[7], castling_mask[0] = 12, 14, 13
+castling_mask[60], castling_mask[63], castling_mask[56] = 3, 11, 7
+
+
+class BitBoard:
+
+    def __init__(self):
+        """A bitboard stores the position as twelve 64-bit integers, one per piece index (see Piece.get_idx()). Bit
+        (8 * ypos + xpos) is set if a piece of that index is on (xpos, ypos). A1 is square 0 and H8 is square 63."""
+        self._bitboards = [0] * 12
+        self._occupied = [0, 0]  # [white pieces, black pieces]
+        self._squares = [None] * 64  # piece index on each square, to find the piece on a square without a scan
+        self._move_count = 0
+        self._turn = 1  # sets the turn to white
+        self._castling = 0  # castling rights (see castling_mask)
+        self._legal_moves = {}  # dictionary to temporarily store legal moves
+        self._pieces_left = {}  # dictionary to temporarily store pieces left
+        self._moves_list = []
+        self._history = []  # (from square, to square, piece idx, captured idx, castling rights, zobrist hash)
+        self._moves_since_capture_list = []
+        self._zobrist_hash = 0
+        self._material = [0, 0]  # [white, black] total worth of the pieces
+        self._midgame = [0, 0]  # [white, black] total of the midgame piece-square table values of the pieces
+        self._endgame = [0, 0]  # [white, black] total of the endgame piece-square table values of the pieces
+        self._phase = 0  # game phase from the remaining pieces (see evaluation.phase_weights)
+
+    def start_game(self):
+        """Starts a standard chess game, initializes the board with pieces"""
+        back_row = [6, 2, 4, 8, 10, 4, 2, 6]  # rook, knight, bishop, queen, king, bishop, knight, rook
+        for x in range(8):
+            self._put(x, back_row[x])
+            self._put(8 + x, 0)
+            self._put(48 + x, 1)
+            self._put(56 + x, back_row[x] + 1)
+        self._castling = 15
+        self.zobrist_hash_init()  # initialize zobrist hash
+
+    def start_from_fen(self, fen: str):
+        """Starts a game from a position in Forsyth-Edwards Notation
+        :param fen: The position, ie "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1" for the start"""
+        pieces, turn, castling, halfmove, fullmove = parse_fen(fen)
+        for (x, y), letter in pieces.items():
+            self._put(y * 8 + x, "PpNnBbRrQqKk".index(letter))
+        for bit, letter, king_sq, rook_sq in [(1, "K", 4, 7), (2, "Q", 4, 0), (4, "k", 60, 63), (8, "q", 60, 56)]:
+            if letter in castling and self._squares[king_sq] == (10 if bit < 4 else 11) \
+                    and self._squares[rook_sq] == (6 if bit < 4 else 7):
+                self._castling |= bit
+
+        self._turn = turn
+        self._move_count = 2 * (fullmove - 1) + (0 if turn == 1 else 1)
+        self._moves_since_capture_list = [False] * halfmove
+        self.zobrist_hash_init()  # initialize zobrist hash
+
+    def snapshot(self) -> bytes:
+        """A compact, immutable (and hashable) copy of the position, restored with restore() (same format as
+        Board.snapshot(), so a snapshot of either board can be restored on the other)
+        :return: The snapshot"""
+        return (self.to_array() + bytes((0 if self._turn == 1 else 1, self._castling,
+                                         min(self.get_moves_since_capture(), 255))) +
+                self._move_count.to_bytes(2, "big"))
+
+    def restore(self, snapshot: bytes):
+        """Set the board to a position from snapshot(). The moves made before are forgotten (they can't be undone)
+        :param snapshot: The snapshot"""
+        self.__init__()
+        for sq, idx in enumerate(snapshot[:64]):
+            if idx != 12:
+                self._put(sq, idx)
+        side, self._castling, halfmove = snapshot[64:67]
+        self._turn = 1 if side == 0 else -1
+        self._move_count = int.from_bytes(snapshot[67:69], "big")
+        self._moves_since_capture_list = [False] * halfmove
+        self.zobrist_hash_init()  # initialize zobrist hash
+
+    def _put(self, sq: int, idx: int):
+        """Put a piece of index idx on an empty square"""
+        bit = 1 << sq
+        self._bitboards[idx] |= bit
+        self._occupied[idx & 1] |= bit
+        self._squares[sq] = idx
+        self._zobrist_hash ^= zobrist_table[sq >> 3][sq & 7][idx]
+        self._material[idx & 1] += piece_worth[idx]
+        self._midgame[idx & 1] += midgame_tables[idx][sq >> 3][sq & 7]
+        self._endgame[idx & 1] += endgame_tables[idx][sq >> 3][sq & 7]
+        self._phase += phase_weights[idx]
+
+    def _remove(self, sq: int, idx: int):
+        """Remove the piece of index idx from a square"""
+        bit = ~(1 << sq)
+        self._bitboards[idx] &= bit
+        self._occupied[idx & 1] &= bit
+        self._squares[sq] = None
+        self._zobrist_hash ^= zobrist_table[sq >> 3][sq & 7][idx]
+        self._material[idx & 1] -= piece_worth[idx]
+        self._midgame[idx & 1] -= midgame_tables[idx][sq >> 3][sq & 7]
+        self._endgame[idx & 1] -= endgame_tables[idx][sq >> 3][sq & 7]
+        self._phase -= phase_weights[idx]
+
+    @Profiler.profile
+    def get_zobrist_hash(self):
+        return self._zobrist_hash
+
+    def zobrist_hash_init(self):
+        """Zobrist hashing: a key for each piece on each square, for the side to move and for each castling right"""
+        self._zobrist_hash = 0
+        for sq in range(64):
+            idx = self._squares[sq]
+            if idx is not None:
+                self._zobrist_hash ^= zobrist_table[sq >> 3][sq & 7][idx]
+
+        if self._turn == -1:
+            self._zobrist_hash ^= zobrist_turn[0]
+        for i in range(4):
+            if (self._castling >> i) & 1:
+                self._zobrist_hash ^= zobrist_castling[i]
+
+    def get_pieces_left(self, color: int) -> dict:
+        """Will get all of the pieces still on the board as well as their locations of a given color. The piece objects
+        are built from the bitboards, so they are only valid until the next move.
+        :param color: team (1 or -1)
+        :return: A dictionary of all the pieces for that team. {key=piece object, val=position tuple}"""
+        if color not in self._pieces_left:
+            pieces = {}
+            for sq in squares(self._occupied[0 if color == 1 else 1]):
+                x, y = all_positions[sq]
+                pieces[piece_types[self._squares[sq]](x, y, color)] = (x, y)
+            self._pieces_left[color] = pieces
+        return self._pieces_left[color]
+
+    def evaluate(self, color: int) -> int:
+        """Static evaluation, kept up to date on every move: the worth of a team's pieces minus those of the other team,
+        plus the difference of their piece-square table values tapered between the midgame and endgame tables by the
+        game phase (integer blend, no division)
+        :param color: The team of the side in question
+        :return: The score (positive if the team is winning)"""
+        scale = phase_scale[self._phase]
+        midgame = self._midgame[0] - self._midgame[1]
+        endgame = self._endgame[0] - self._endgame[1]
+        score = self._material[0] - self._material[1] + ((midgame * scale + endgame * (256 - scale)) >> 8)
+        return score if color == 1 else -score  # blend from white's side, so the two teams' scores are exact opposites
+
+    def to_array(self) -> bytes:
+        """Export the position for batch evaluation (see batch_eval.py)
+        :return: 64 bytes, one per square (8 * ypos + xpos): the index of the piece on it, or 12 if it is empty"""
+        return bytes(12 if idx is None else idx for idx in self._squares)
+
+    def get_moves_since_capture(self):
+        """Get number of moves since the last capture"""
+        i = 0
+        for b in self._moves_since_capture_list[::-1]:
+            if b:  # if b is True
+                return i
+            i += 1
+        return i
+
+    def _make(self, frm: int, to: int):
+        """Make a move from square frm to square to, promoting pawns and moving the rook when castling"""
+        idx = self._squares[frm]
+        captured = self._squares[to]
+        self._history.append((frm, to, idx, captured, self._castling, self._zobrist_hash))
+
+        self._remove(frm, idx)
+        if captured is not None:
+            self._remove(to, captured)
+        if idx <= 1 and (to < 8 or to >= 56):  # pawn promotion (always to a queen)
+            self._put(to, 8 + idx)
+        else:
+            self._put(to, idx)
+
+        if idx >= 10 and abs(to - frm) == 2:  # castle, move the corresponding rook
+            if to > frm:  # king-side castle
+                self._remove(to + 1, idx - 4)
+                self._put(to - 1, idx - 4)
+            else:  # queen-side castle
+                self._remove(to - 2, idx - 4)
+                self._put(to + 1, idx - 4)
+
+        castling = self._castling & castling_mask[frm] & castling_mask[to]
+        if castling != self._castling:
+            for i in range(4):
+                if ((castling ^ self._castling) >> i) & 1:
+                    self._zobrist_hash ^= zobrist_castling[i]
+            self._castling = castling
+        self._moves_since_capture_list.append(captured is not None)
+        self._move_count += 1
+
+    def _unmake(self):
+        """Unmake the last move made with _make"""
+        frm, to, idx, captured, castling, zobrist_hash = self._history.pop()
+
+        if idx >= 10 and abs(to - frm) == 2:  # undo castle, put the rook back
+            if to > frm:
+                self._remove(to - 1, idx - 4)
+                self._put(to + 1, idx - 4)
+            else:
+                self._remove(to + 1, idx - 4)
+                self._put(to - 2, idx - 4)
+
+        self._remove(to, self._squares[to])  # the moved piece (or the queen it was promoted to)
+        if captured is not None:
+            self._put(to, captured)
+        self._put(frm, idx)
+
+        self._castling = castling
+        self._zobrist_hash = zobrist_hash
+        self._moves_since_capture_list.pop()
+        self._move_count -= 1
+
+    @Profiler.profile
+    def move_piece(self, pos1: tuple, pos2: tuple, check=True) -> None:
+        """Moves a piece from one position to another, checking legality of move if specified
+        :param pos1: A tuple containing int positions for x and y. Current Position
+        :param pos2: A tuple containing int positions for x and y. Desired Position
+        :param check: whether should check if in legal moves (can make False if only making move from legal moves)"""
+        if check:
+            if (pos1 not in self.legal_moves().keys()) or (pos2 not in self.legal_moves()[pos1]):
+                raise InvalidBoardMoveError(pos1, pos2)
+
+        self._moves_list.append((pos1, pos2))  # add move to list of moves
+        self._make(pos1[1] * 8 + pos1[0], pos2[1] * 8 + pos2[0])
+        self.switch_turn()
+
+    def undo_move(self):
+        """Unmake the last move (pos1, pos2) from the board"""
+        if self._moves_list[-1] is None:
+            return self.undo_null_move()
+
+        self._moves_list.pop()
+        self.switch_turn()
+        self._unmake()  # restores the zobrist hash saved before the move
+
+    def make_null_move(self):
+        """Pass the turn without moving a piece (for null move pruning): no piece moves, but the side to move and the
+        zobrist hash change, the move count goes up by one and None is added to the move list (so undo_move() and an
+        aborted search, which unmakes moves until the move count is back, undo it like any move). Undone by
+        undo_null_move() or undo_move()"""
+        self._moves_list.append(None)
+        self._move_count += 1
+        self.switch_turn()
+
+    def undo_null_move(self):
+        """Undo a null move made with make_null_move()"""
+        self._moves_list.pop()
+        self._move_count -= 1
+        self.switch_turn()
+
+    def has_non_pawn_material(self, color: int) -> bool:
+        """:return: True if a team has pieces other than pawns and its king"""
+        side = 0 if color == 1 else 1
+        b = self._bitboards
+        return bool(b[2 + side] | b[4 + side] | b[6 + side] | b[8 + side])
+
+    def switch_turn(self):
+        """Switches the turn from white to black or black to white. Resets the stored legal moves and pieces left"""
+        self._turn *= -1
+        self._zobrist_hash ^= zobrist_turn[0]
+        self._legal_moves = {}
+        self._pieces_left = {}
+
+    def get_piece_from_position(self, position: tuple) -> Union[Piece, None]:
+        """Returns a new piece object or none for a position, raises error if out of bounds error
+        :param position: A tuple of integers of the indices of the position desired
+        :return: A piece object or None if no object is returned"""
+        x, y = position
+        if not (0 <= x <= 7 and 0 <= y <= 7):
+            raise IndexError("The desired position is out of bounds of the board")
+        idx = self._squares[y * 8 + x]
+        if idx is None:
+            return None
+        return piece_types[idx](x, y, 1 if idx % 2 == 0 else -1)
+
+    def is_position_empty(self, position: tuple) -> bool:
+        """Checks if a desired position is empty, returns true if Empty
+        :param position: Tuple of indices a position which you would like to check if a piece exists there
+        :return: True if position is empty, false if not"""
+        return self.get_piece_from_position(position) is None
+
+    def get_board(self) -> list:
+        """:return: The position as a 2D array of pieces and None objects (like Board.get_board())"""
+        return [[self.get_piece_from_position((x, y)) for x in range(8)] for y in range(8)]
+
+    def get_current_turn(self) -> int:
+        """:return: The integer representing who's turn it is (1 is white, -1 is black)"""
+        return self._turn
+
+    def get_current_move_count(self) -> int:
+        """:return: The current move count"""
+        return self._move_count
+
+    def get_last_move(self):
+        """:return: The last move made ((x1, y1), (x2, y2)), or None if there is none (or it was a null move)"""
+        return self._moves_list[-1] if self._moves_list else None
+
+    def get_moves(self) -> list:
+        """:return: List of the moves made so far ((x1, y1), (x2, y2)), first move first"""
+        return list(self._moves_list)
+
+    def __repr__(self):
+        alphabet = ["A", "B", "C", "D", "E", "F", "G", "H"]
+        string = " "
+        for letter in alphabet:
+            string += "{:>8}".format(letter)
+        string += "\n\n"
+        for i in range(7, -1, -1):
+            string += str(i)
+            for j in self.get_board()[i]:  # each row
+                string += "{:>8}".format(str(j))
+            string += "\n"
+        return string
+
+    def _is_square_attacked(self, sq: int, side: int) -> bool:
+        """Return if a square is attacked by the pieces of side (0 for white, 1 for black)"""
+        b = self._bitboards
+        if knight_attacks[sq] & b[2 + side] or king_attacks[sq] & b[10 + side]:
+            return True
+        if pawn_attacks[1 - side][sq] & b[side]:  # a pawn attacks sq if a pawn on sq would attack it back
+            return True
+        occupied = self._occupied[0] | self._occupied[1]
+        rooks = b[6 + side] | b[8 + side]
+        if rooks and rook_attacks(sq, occupied) & rooks:
+            return True
+        bishops = b[4 + side] | b[8 + side]
+        if bishops and bishop_attacks(sq, occupied) & bishops:
+            return True
+        return False
+
+    def is_attacked(self, pos1x: int, pos1y: int, c: int):
+        """Return if a square is being attacked by the team other than c"""
+        return self._is_square_attacked(pos1y * 8 + pos1x, 1 if c == 1 else 0)
+
+    def is_in_check(self, c: int):
+        """Returns where a specified team is in check or not
+        :param c: the color corresponding to the specified team
+        :return True if that team is in check and false otherwise"""
+        king = self._bitboards[10 if c == 1 else 11]
+        if not king:
+            raise NoKingError(c)
+        return self._is_square_attacked(king.bit_length() - 1, 1 if c == 1 else 0)
+
+    def get_king_position(self, color: int) -> tuple:
+        """Returns the position of the king as a tuple (x,y)
+        :param color: 1 or -1 for white or black respectively
+        :return: Tuple of the position of the king of specified color"""
+        king = self._bitboards[10 if color == 1 else 11]
+        if not king:
+            raise NoKingError(color)
+        return all_positions[king.bit_length() - 1]
+
+    def _pseudo_legal_moves(self):
+        """Generate (from square, to square) for every move of the side to move that follows the movement rules of the
+        pieces, without checking whether it leaves the king in check"""
+        side = 0 if self._turn == 1 else 1
+        b = self._bitboards
+        own, enemy = self._occupied[side], self._occupied[1 - side]
+        occupied = own | enemy
+        targets = ~own & ~b[11 - side] & full_board  # never capture the king
+
+        step = 8 if side == 0 else -8
+        start_rank = 1 if side == 0 else 6
+        for frm in squares(b[side]):  # pawns
+            to = frm + step
+            if not (occupied >> to) & 1:
+                yield frm, to
+                if frm >> 3 == start_rank and not (occupied >> (to + step)) & 1:
+                    yield frm, to + step
+            for to in squares(pawn_attacks[side][frm] & enemy & targets):
+                yield frm, to
+
+        for frm in squares(b[2 + side]):  # knights
+            for to in squares(knight_attacks[frm] & targets):
+                yield frm, to
+        for frm in squares(b[4 + side] | b[8 + side]):  # bishops and the diagonal moves of queens
+            for to in squares(bishop_attacks(frm, occupied) & targets):
+                yield frm, to
+        for frm in squares(b[6 + side] | b[8 + side]):  # rooks and the straight moves of queens
+            for to in squares(rook_attacks(frm, occupied) & targets):
+                yield frm, to
+
+        for frm in squares(b[10 + side]):  # king
+            for to in squares(king_attacks[frm] & targets):
+                yield frm, to
+
+            # castling: king and rook weren't moved, the squares between are empty, and the king doesn't castle out of
+            # or through check (castling into check is caught by the legality test)
+            rights = self._castling >> (2 * side)
+            if rights & 3 and not self._is_square_attacked(frm, 1 - side):
+                if rights & 1 and not occupied & (3 << (frm + 1)) and not self._is_square_attacked(frm + 1, 1 - side):
+                    yield frm, frm + 2
+                if rights & 2 and not occupied & (7 << (frm - 3)) and not self._is_square_attacked(frm - 1, 1 - side):
+                    yield frm, frm - 2
+
+    @Profiler.profile
+    def legal_moves(self) -> dict:
+        """Finds all possible legal moves for the team whose turn it is.
+        :return: Dictionary, key is position tuple for a piece, value is list of tuples of positions it can move to."""
+        if self._legal_moves != {}:
+            return self._legal_moves
+
+        possible_moves = collections.defaultdict(list)
+        side = 0 if self._turn == 1 else 1
+        for frm, to in list(self._pseudo_legal_moves()):
+            self._make(frm, to)  # temporarily make the move
+            king = self._bitboards[10 + side]
+            if not self._is_square_attacked(king.bit_length() - 1, 1 - side):  # add to list if legal
+                possible_moves[all_positions[frm]].append(all_positions[to])
+            self._unmake()  # unmake the temporary move
+
+        self._legal_moves = possible_moves
+        return possible_moves
+
+    @Profiler.profile
+    def legal_captures(self) -> list:
+        """Finds the legal captures and pawn promotions for the team whose turn it is (the moves searched by quiescence
+        search)
+        :return: List of moves ((x1, y1), (x2, y2)), most valuable victim first, then least valuable attacker first"""
+        side = 0 if self._turn == 1 else 1
+        enemy = self._occupied[1 - side]
+        last_rank = 0xFF << (56 if side == 0 else 0)
+        captures = []  # (victim worth, attacker index, from square, to square)
+        for frm, to in list(self._pseudo_legal_moves()):
+            idx, captured = self._squares[frm], self._squares[to]
+            promotion = idx < 2 and (1 << to) & last_rank
+            if not ((1 << to) & enemy or promotion):
+                continue
+            self._make(frm, to)  # temporarily make the move
+            king = self._bitboards[10 + side]
+            if not self._is_square_attacked(king.bit_length() - 1, 1 - side):  # add to list if legal
+                worth = piece_worth[captured] if captured is not None else 0
+                if promotion:
+                    worth += piece_worth[8] - piece_worth[0]  # promotion to a queen
+                captures.append((worth, idx, frm, to))
+            self._unmake()  # unmake the temporary move
+
+        captures.sort(key=lambda c: (-c[0], c[1]))
+        return [(all_positions[frm], all_positions[to]) for _, _, frm, to in captures]
+
+    @Profiler.profile
+    def checkmate(self) -> bool:
+        """Determines if the current team is in checkmate.
+        :return: Returns true if the team is in checkmate, false otherwise"""
+        return self.is_in_check(self._turn) and (len(self.legal_moves()) == 0)
+
+    @Profiler.profile
+    def is_game_over(self):
+        """Determines if game is over based on if the team can no longer move, or if game is a draw
+        :return: True if the game is over, False if the game is not over"""
+        if len(self.legal_moves()) == 0:
+            print('game over')
+            return True
+        elif self.get_moves_since_capture() > 49:
+            print('draw (50 move rule)')
+            return True
+        elif self._move_count > 200:
+            print('draw (200 move rule)')
+            return True
+        return False
+
+    def winner(self):
+        """Determines which team won when the game ends
+        :return: 3=white win, 1= white put black in stalemate, negative numbers for black, 0 for a draw (ie 200 move)"""
+        if len(self.legal_moves()) == 0:
+            if self.is_in_check(self._turn):
+                print('checkmate')
+                return self._turn * -3
+            else:
+                print('stalemate')
+                return self._turn
+        else:
+            return 0
+
+    def fen_hash(self):
+        """Board hashing using modified Forsyth-Edwards Notation (same format as Board.fen_hash())"""
+        fen = ""
+        for i in range(7, -1, -1):  # 7, 6, ..., 1, 0
+            k = 0
+            for j in range(8):
+                idx = self._squares[i * 8 + j]
+                if idx is not None:
+                    if k > 0:
+                        fen += str(k)
+                    k = 0
+                    fen += "PpNnBbRrQqKk"[idx]
+                else:
+                    k += 1
+
+            if k > 0:
+                fen += str(k)
+
+        if self._turn == 1:
+            fen += "w"
+        else:
+            fen += "b"
+
+        for bit, letter in [(1, "K"), (2, "Q"), (4, "k"), (8, "q")]:
+            if self._castling & bit:
+                fen += letter
+
+        return fen
+
+    def get_fen(self) -> str:
+        """The position in Forsyth-Edwards Notation (the inverse of start_from_fen)
+        :return: The position, ie "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1" at the start"""
+        rows = []
+        for y in range(7, -1, -1):
+            row, empty = "", 0
+            for x in range(8):
+                idx = self._squares[y * 8 + x]
+                if idx is not None:
+                    row += (str(empty) if empty else "") + "PpNnBbRrQqKk"[idx]
+                    empty = 0
+                else:
+                    empty += 1
+            rows.append(row + (str(empty) if empty else ""))
+
+        castling = "".join(letter for bit, letter in [(1, "K"), (2, "Q"), (4, "k"), (8, "q")]
+                           if self._castling & bit) or "-"
+        turn = "w" if self._turn == 1 else "b"
+        return f"{'/'.join(rows)} {turn} {castling} - {self.get_moves_since_capture()} {self._move_count // 2 + 1}"
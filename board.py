@@ -4,7 +4,17 @@ from pieces import *
 from typing import Union
 import collections
 from profiler import Profiler
-from all_moves import all_positions, zobrist_table
+from all_moves import all_positions, zobrist_table, zobrist_turn, zobrist_castling
+from evaluation import piece_worth, midgame_tables, endgame_tables, phase_weights, phase_scale
+from attacks import knight_attacks, king_attacks, pawn_attacks, rook_attacks, bishop_attacks, between, squares
+
+
+# castling rights bit: (king position, rook position). 1 = white king-side, 2 = white queen-side, 4 = black king-side,
+# 8 = black queen-side. The rights only change when a piece moves from or to one of these squares
+castling_positions = {1: ((4, 0), (7, 0)), 2: ((4, 0), (0, 0)), 4: ((4, 7), (7, 7)), 8: ((4, 7), (0, 7))}
+castling_squares = {(4, 0), (7, 0), (0, 0), (4, 7), (7, 7), (0, 7)}
+piece_classes = [Pawn, Knight, Bishop, Rook, Queen, King]  # by piece index // 2
+snapshot_size = 69  # bytes in a Board.snapshot()
 
 
 class NoKingError(Exception):
@@ -19,6 +29,44 @@ class InvalidBoardMoveError(Exception):
         super().__init__(f"The move {pos1} to {pos2} is not a legal move.")
 
 
+class InvalidFenError(Exception):
+
+    def __init__(self, fen):
+        super().__init__(f"Invalid FEN: {fen} is not a valid position in Forsyth-Edwards Notation.")
+
+
+def parse_fen(fen: str):
+    """Split a position in Forsyth-Edwards Notation into its fields. The en passant field is ignored, since en passant
+    isn't supported by the board.
+    :param fen: The position, ie "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    :return: ({key=(x, y), val=piece letter}, turn (1 or -1), castling rights string, halfmove clock, fullmove number)"""
+    fields = fen.split()
+    if len(fields) < 2 or fields[1] not in ("w", "b"):
+        raise InvalidFenError(fen)
+
+    pieces = {}
+    rows = fields[0].split("/")
+    if len(rows) != 8:
+        raise InvalidFenError(fen)
+    for i, row in enumerate(rows):  # the first row is the 8th rank (y = 7)
+        x = 0
+        for letter in row:
+            if letter.isdigit():
+                x += int(letter)
+            elif letter.upper() in "PNBRQK" and x <= 7:
+                pieces[(x, 7 - i)] = letter
+                x += 1
+            else:
+                raise InvalidFenError(fen)
+        if x != 8:
+            raise InvalidFenError(fen)
+
+    castling = fields[2] if len(fields) > 2 else "-"
+    halfmove = int(fields[4]) if len(fields) > 4 else 0
+    fullmove = int(fields[5]) if len(fields) > 5 else 1
+    return pieces, (1 if fields[1] == "w" else -1), castling, halfmove, fullmove
+
+
 class Board:
 
     def __init__(self):
@@ -35,6 +83,15 @@ class Board:
         self._pieces_left = collections.defaultdict(dict)  # piece references {key=color, val={key=piece, val=pos}}
         self._zobrist_hash = 0
         self._zobrist_list = []
+        self._castling_rights = 0  # castling rights bits (see castling_positions)
+        self._bitboards = [0] * 12  # one bitboard per piece index (bit 8 * ypos + xpos), kept in sync with self._board
+        self._occupied = [0, 0]  # [white pieces, black pieces]
+        self._attack_maps = [None, None]  # [white, black] squares attacked by each side, built when first needed
+        self._attack_maps_hash = None  # the zobrist hash of the position the attack maps were built in
+        self._material = [0, 0]  # [white, black] total worth of the pieces
+        self._midgame = [0, 0]  # [white, black] total of the midgame piece-square table values of the pieces
+        self._endgame = [0, 0]  # [white, black] total of the endgame piece-square table values of the pieces
+        self._phase = 0  # game phase from the remaining pieces (see evaluation.phase_weights)
 
     def start_game(self):
         """Starts a standard chess game, initializes the board with pieces"""
@@ -59,6 +116,71 @@ class Board:
                 self._pieces_left[p.get_color()][p] = p.get_position()
 
         self.zobrist_hash_init()  # initialize zobrist hash
+        self.bitboards_init()  # initialize bitboards
+
+    def start_from_fen(self, fen: str):
+        """Starts a game from a position in Forsyth-Edwards Notation. Kings and rooks that lost their castling rights
+        are marked as moved.
+        :param fen: The position, ie "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1" for the start"""
+        pieces, turn, castling, halfmove, fullmove = parse_fen(fen)
+        rights = 0
+        for bit, letter in [(1, "K"), (2, "Q"), (4, "k"), (8, "q")]:
+            if letter in castling:
+                rights |= bit
+        self._set_position({pos: "PpNnBbRrQqKk".index(letter) for pos, letter in pieces.items()}, turn, rights,
+                           halfmove, 2 * (fullmove - 1) + (0 if turn == 1 else 1))
+
+    def snapshot(self) -> bytes:
+        """A compact, immutable (and hashable) copy of the position, restored with restore(). The snapshot_size bytes
+        are the piece index on each square (12 if empty, as to_array()), the side to move (0 for white, 1 for black),
+        the castling rights bits, the moves since the last capture (at most 255) and the move count (2 bytes)
+        :return: The snapshot"""
+        return (self.to_array() + bytes((0 if self._turn == 1 else 1, self._castling_rights,
+                                         min(self.get_moves_since_capture(), 255))) +
+                self._move_count.to_bytes(2, "big"))
+
+    def restore(self, snapshot: bytes):
+        """Set the board to a position from snapshot(). The moves made before are forgotten (they can't be undone)
+        :param snapshot: The snapshot"""
+        pieces = {all_positions[sq]: idx for sq, idx in enumerate(snapshot[:64]) if idx != 12}
+        side, rights, halfmove = snapshot[64:67]
+        self._set_position(pieces, 1 if side == 0 else -1, rights, halfmove, int.from_bytes(snapshot[67:69], "big"))
+
+    def _set_position(self, pieces: dict, turn: int, rights: int, halfmove: int, move_count: int):
+        """Set up a position, clearing the move history. Kings and rooks without castling rights, and pawns off their
+        starting rank, are marked as moved.
+        :param pieces: {key=(x, y), val=piece index}
+        :param turn: The team to move (1 or -1)
+        :param rights: The castling rights bits (see castling_positions)
+        :param halfmove: The number of moves since the last capture
+        :param move_count: The number of moves made in the game"""
+        unmoved = set()
+        for bit, positions in castling_positions.items():
+            if rights & bit:
+                unmoved.update(positions)
+
+        self._board = [[None for _ in range(8)] for _ in range(8)]
+        self._pieces_left = collections.defaultdict(dict)
+        for (x, y), idx in pieces.items():
+            p = piece_classes[idx >> 1](x, y, 1 if idx % 2 == 0 else -1)
+            if isinstance(p, (King, Rook)) and (x, y) not in unmoved:
+                p.num_moves = 1
+            elif isinstance(p, Pawn) and y != (1 if p.get_color() == 1 else 6):
+                p.num_moves = 1
+            self._board[y][x] = p
+            self._pieces_left[p.get_color()][p] = p.get_position()
+
+        self._turn = turn
+        self._move_count = move_count
+        self._moves_since_capture_list = [False] * halfmove
+        self._legal_moves = {}
+        self._moves_list = []
+        self._captured_pieces = []
+        self._promoted_pawns = []
+        self._zobrist_list = []
+
+        self.zobrist_hash_init()  # initialize zobrist hash
+        self.bitboards_init()  # initialize bitboards
 
     def _start_test_game(self):
         """Starts a game for testing piece movement and game logic. (Testing purposes only!!!)"""
@@ -81,6 +203,7 @@ class Board:
                 self._pieces_left[p.get_color()][p] = p.get_position()
 
         self.zobrist_hash_init()  # initialize zobrist hash
+        self.bitboards_init()  # initialize bitboards
 
     @Profiler.profile
     def get_zobrist_hash(self):
@@ -140,10 +263,10 @@ class Board:
             pos1x, pos2x = 7, 5  # old rook x and new rook x
 
         rook = self.get_piece_from_position((pos1x, pos2y))
-        self._update_zobrist_hash(pos1x, pos2y, rook.get_idx())
+        self._toggle_piece(pos1x, pos2y, rook.get_idx())
         self._board[pos2y][pos2x], self._board[pos2y][pos1x] = rook, None
         self.update_pieces(rook, pos2x, pos2y)
-        self._update_zobrist_hash(pos2x, pos2y, rook.get_idx())
+        self._toggle_piece(pos2x, pos2y, rook.get_idx())
 
     def _move_to_space(self, piece: Piece, pos2x: int, pos2y: int):
         """
@@ -151,7 +274,7 @@ class Board:
         :return deleted pawn if it was promoted, None otherwise
         """
         pos1x, pos1y = piece.get_position()
-        self._update_zobrist_hash(pos1x, pos1y, piece.get_idx())
+        self._toggle_piece(pos1x, pos1y, piece.get_idx())
         if isinstance(piece, Pawn) and (pos2y == 0 or pos2y == 7):
             self._promoted_pawns.append(piece)
             piece = self._pawn_promotion(piece, pos2x, pos2y)  # queen
@@ -159,7 +282,7 @@ class Board:
             self._promoted_pawns.append(None)
             self.update_pieces(piece, pos2x, pos2y)
 
-        self._update_zobrist_hash(pos2x, pos2y, piece.get_idx())
+        self._toggle_piece(pos2x, pos2y, piece.get_idx())
         self._board[pos2y][pos2x], self._board[pos1y][pos1x] = piece, None
         self.update_move_count()
         self._moves_since_capture_list.append(False)
@@ -173,15 +296,15 @@ class Board:
         """capture piece2 with piece1"""
         pos1x, pos1y = piece1.get_position()
         pos2x, pos2y = piece2.get_position()
-        self._update_zobrist_hash(pos1x, pos1y, piece1.get_idx())
+        self._toggle_piece(pos1x, pos1y, piece1.get_idx())
+        self._toggle_piece(pos2x, pos2y, piece2.get_idx())  # empty the square before piece1 moves onto it
         if isinstance(piece1, Pawn) and (pos2y == 0 or pos2y == 7):  # Pawn promotion after capture
             self._promoted_pawns.append(piece1)
             piece1 = self._pawn_promotion(piece1, pos2x, pos2y)  # queen
         else:
             self._promoted_pawns.append(None)
             self.update_pieces(piece1, pos2x, pos2y)
-        self._update_zobrist_hash(pos2x, pos2y, piece1.get_idx())
-        self._update_zobrist_hash(pos2x, pos2y, piece2.get_idx())
+        self._toggle_piece(pos2x, pos2y, piece1.get_idx())
 
         self._board[pos2y][pos2x], self._board[pos1y][pos1x] = piece1, None  # update positions on the board
         self.delete_piece(piece2)  # delete captured piece
@@ -204,22 +327,22 @@ class Board:
             pos1x, pos2x = 7, 5  # old rook x and new rook x
 
         rook = self.get_piece_from_position((pos2x, pos2y))
-        self._update_zobrist_hash(pos2x, pos2y, rook.get_idx())
+        self._toggle_piece(pos2x, pos2y, rook.get_idx())
         self._board[pos2y][pos2x], self._board[pos2y][pos1x] = None, rook
         self.update_pieces(rook, pos1x, pos2y, revert=True)  # = (pos1x, pos1y)
-        self._update_zobrist_hash(pos1x, pos2y, rook.get_idx())
+        self._toggle_piece(pos1x, pos2y, rook.get_idx())
 
     def _undo_move_to_space(self, piece: Piece, pos1, promoted):
         """make move on board
         :return deleted pawn if it was promoted, None otherwise"""
         pos1x, pos1y = pos1
         pos2x, pos2y = piece.get_position()
-        self._update_zobrist_hash(pos2x, pos2y, piece.get_idx())
+        self._toggle_piece(pos2x, pos2y, piece.get_idx())
         if isinstance(promoted, Pawn):  # need to undo promote (piece is queen):
             piece = self._undo_promotion(promoted, piece)  # pawn
         else:
             self.update_pieces(piece, pos1x, pos1y, revert=True)
-        self._update_zobrist_hash(pos1x, pos1y, piece.get_idx())
+        self._toggle_piece(pos1x, pos1y, piece.get_idx())
         self._board[pos2y][pos2x], self._board[pos1y][pos1x] = None, piece
         self.update_move_count(False)
         self._moves_since_capture_list.pop()
@@ -231,15 +354,15 @@ class Board:
         """undo capture piece2 with piece1"""
         pos1x, pos1y = pos1
         pos2x, pos2y = piece1.get_position()  # = captured_piece.get_position()  # piece1=queen
-        self._update_zobrist_hash(pos2x, pos2y, piece1.get_idx())
+        self._toggle_piece(pos2x, pos2y, piece1.get_idx())
 
         if isinstance(promoted, Pawn):  # need to undo promote
             piece1 = self._undo_promotion(promoted, piece1)  # pawn
         else:
             self.update_pieces(piece1, pos1x, pos1y, revert=True)  # moves piece to new position
 
-        self._update_zobrist_hash(pos1x, pos1y, piece1.get_idx())
-        self._update_zobrist_hash(pos2x, pos2y, captured_piece.get_idx())
+        self._toggle_piece(pos1x, pos1y, piece1.get_idx())
+        self._toggle_piece(pos2x, pos2y, captured_piece.get_idx())
 
         self._board[pos2y][pos2x], self._board[pos1y][pos1x] = captured_piece, piece1  # update positions on the board
         self.add_piece(captured_piece)  # add captured piece
@@ -267,10 +390,15 @@ class Board:
         else:  # if the place moving to is not empty; capturing from other team
             piece2 = self.get_piece_from_position(pos2)  # can be piece or none
             self._capture_piece(piece1, piece2)  # return the captured piece
+        if pos1 in castling_squares or pos2 in castling_squares:
+            self._update_castling_rights()
         self.switch_turn()
 
     def undo_move(self):
         """Unmake the last move (pos1, pos2) from the board"""
+        if self._moves_list[-1] is None:
+            return self.undo_null_move()
+
         self._zobrist_list = []
         pos1, pos2 = self._moves_list.pop()  # get the last move
         piece1 = self.get_piece_from_position(pos2)
@@ -282,8 +410,31 @@ class Board:
             self._undo_move_to_space(piece1, pos1, promoted)
         else:  # a capture
             self._undo_capture_piece(piece1, captured_piece, pos1, promoted)
+        if pos1 in castling_squares or pos2 in castling_squares:
+            self._update_castling_rights()
+        self.switch_turn()
+
+    def make_null_move(self):
+        """Pass the turn without moving a piece (for null move pruning): no piece moves, but the side to move and the
+        zobrist hash change, the move count goes up by one and None is added to the move list (so undo_move() and an
+        aborted search, which unmakes moves until the move count is back, undo it like any move). Undone by
+        undo_null_move() or undo_move()"""
+        self._moves_list.append(None)
+        self.update_move_count()
+        self.switch_turn()
+
+    def undo_null_move(self):
+        """Undo a null move made with make_null_move()"""
+        self._moves_list.pop()
+        self.update_move_count(False)
         self.switch_turn()
 
+    def has_non_pawn_material(self, color: int) -> bool:
+        """:return: True if a team has pieces other than pawns and its king"""
+        side = 0 if color == 1 else 1
+        b = self._bitboards
+        return bool(b[2 + side] | b[4 + side] | b[6 + side] | b[8 + side])
+
     def is_piece_in_the_way(self, pos1x: int, pos1y: int, pos2x: int, pos2y: int) -> bool:
         """
         Checks if there are any pieces in the way between two different positions on the board
@@ -298,41 +449,17 @@ class Board:
         if isinstance(piece1, Knight):  # Knight can jump over pieces so it doesn't matter
             return False
 
-        # Checks to see if there are any pieces blocking each other
-        dx = pos2x - pos1x  # difference in y
-        dy = pos2y - pos1y  # difference in x
-
-        # Case where the piece moved only in the y direction
-        if dx == 0:  # can assume dy != 0 as validate_turn_color will have thrown an error
-            for i in range(min(pos1y, pos2y) + 1, max(pos1y, pos2y)):
-                if self._board[i][pos2x] is not None:
-                    return True
-
-        # Case where the piece only moved in the x direction
-        elif dy == 0:  # can assume dx != 0 as validate_turn_color will have thrown an error
-            for i in range(min(pos1x, pos2x) + 1, max(pos1x, pos2x)):
-                if self._board[pos2y][i] is not None:
-                    return True
-
-        # Case where the piece moved diagonally (iterate over x from smallest to largest)
-        else:
-            minx, maxx = min(pos1x, pos2x), max(pos1x, pos2x)  # to iterate over x from smallest to largest
-            if dy / dx > 0:  # positive if the slope is positive
-                miny = min(pos1y, pos2y)
-                for i in range(maxx - minx - 1):  # 0, 1, ... n, n is # in between
-                    # if isinstance(self._board[miny + i + 1][minx + i + 1], Piece):
-                    if self._board[miny + i + 1][minx + i + 1] is not None:
-                        return True
-            else:  # if the slope is negative
-                maxy = max(pos1y, pos2y)
-                for i in range(maxx - minx - 1):  # 0, 1, ... n, n is # in between
-                    if self._board[maxy - i - 1][minx + i + 1] is not None:
-                        return True
-        return False
+        # nothing is in the way if the target square is attacked along the line (a single lookup in the attack tables)
+        sq1, sq2 = pos1y * 8 + pos1x, pos2y * 8 + pos2x
+        occupied = self._occupied[0] | self._occupied[1]
+        if pos1x == pos2x or pos1y == pos2y:  # the piece moved only in the x or the y direction
+            return not (rook_attacks(sq1, occupied) >> sq2) & 1
+        return not (bishop_attacks(sq1, occupied) >> sq2) & 1  # the piece moved diagonally
 
     def switch_turn(self):
         """Switches the turn from white to black or black to white. Resets the dictionary for stored legal moves"""
         self._turn *= -1
+        self._zobrist_hash ^= zobrist_turn[0]
         self._legal_moves = {}
 
     def get_piece_from_position(self, position: tuple) -> Union[Piece, None]:
@@ -383,6 +510,14 @@ class Board:
         """:return: The current move count"""
         return self._move_count
 
+    def get_last_move(self):
+        """:return: The last move made ((x1, y1), (x2, y2)), or None if there is none (or it was a null move)"""
+        return self._moves_list[-1] if self._moves_list else None
+
+    def get_moves(self) -> list:
+        """:return: List of the moves made so far ((x1, y1), (x2, y2)), first move first"""
+        return list(self._moves_list)
+
     def update_move_count(self, adding=True):
         """Updates the current move count
         :param adding: adds if adding is true, if false it decreases move count"""
@@ -404,40 +539,57 @@ class Board:
             string += "\n"
         return string
 
-    def is_attacked(self, pos1x: int, pos1y: int, c: int):
-        """Return if a square is being attacked"""
-        consider = self.get_pieces_left(-1 * c)  # set consider to corresponding dictionary (the other team's pieces)
-        for p in consider.keys():
-            pos2x, pos2y = consider[p]
-            if isinstance(p, Pawn):
-                # checks if the king is diagonal to the pawn
-                if (pos2y + p.get_color() == pos1y) and (abs(pos2x - pos1x) == 1):
-                    return True
-            else:
-                if p.can_move_to(pos1x, pos1y) and (not self.is_piece_in_the_way(pos2x, pos2y, pos1x, pos1y)):
-                    return True
+    def _is_square_attacked(self, sq: int, side: int) -> bool:
+        """Return if a square is attacked by the pieces of side (0 for white, 1 for black), using the attack tables"""
+        b = self._bitboards
+        if knight_attacks[sq] & b[2 + side] or king_attacks[sq] & b[10 + side]:
+            return True
+        if pawn_attacks[1 - side][sq] & b[side]:  # a pawn attacks sq if a pawn on sq would attack it back
+            return True
+        occupied = self._occupied[0] | self._occupied[1]
+        rooks = b[6 + side] | b[8 + side]
+        if rooks and rook_attacks(sq, occupied) & rooks:
+            return True
+        bishops = b[4 + side] | b[8 + side]
+        return bool(bishops and bishop_attacks(sq, occupied) & bishops)
+
+    def _attack_map(self, side: int) -> int:
+        """The squares attacked by the pieces of side (0 for white, 1 for black). The map is built from the bitboards
+        the first time it is needed in a position and kept while the zobrist hash is unchanged, so make/undo never pays
+        for it
+        :return: Bitboard of the attacked squares"""
+        if self._attack_maps_hash != self._zobrist_hash:  # the position changed since the maps were built
+            self._attack_maps, self._attack_maps_hash = [None, None], self._zobrist_hash
+        attacks = self._attack_maps[side]
+        if attacks is None:
+            b = self._bitboards
+            occupied = self._occupied[0] | self._occupied[1]
+            attacks = 0
+            for sq in squares(b[side]):
+                attacks |= pawn_attacks[side][sq]
+            for sq in squares(b[2 + side]):
+                attacks |= knight_attacks[sq]
+            for sq in squares(b[4 + side] | b[8 + side]):
+                attacks |= bishop_attacks(sq, occupied)
+            for sq in squares(b[6 + side] | b[8 + side]):
+                attacks |= rook_attacks(sq, occupied)
+            attacks |= king_attacks[b[10 + side].bit_length() - 1] if b[10 + side] else 0
+            self._attack_maps[side] = attacks
+        return attacks
 
-        return False
+    def is_attacked(self, pos1x: int, pos1y: int, c: int):
+        """Return if a square is being attacked by the team other than c (a lookup in the attack maps)"""
+        return (self._attack_map(1 if c == 1 else 0) >> (pos1y * 8 + pos1x)) & 1 == 1
 
     # @Profiler.profile
     def is_in_check(self, c: int):
         """Returns where a specified team is in check or not
         :param c: the color corresponding to the specified team
         :return True if that team is in check and false otherwise"""
-        pos1x, pos1y = self.get_king_position(c)  # get corresponding king position (from the dictionary of pieces left)
-        consider = self.get_pieces_left(-1 * c)  # set consider to corresponding dictionary (the other team's pieces)
-
-        for p in consider.keys():
-            pos2x, pos2y = consider[p]
-            if isinstance(p, Pawn):
-                # checks if the king is diagonal to the pawn
-                if (pos2y + p.get_color() == pos1y) and (abs(pos2x - pos1x) == 1):
-                    return True
-            else:
-                if p.can_move_to(pos1x, pos1y) and (not self.is_piece_in_the_way(pos2x, pos2y, pos1x, pos1y)):
-                    return True
-
-        return False
+        king = self._bitboards[10 if c == 1 else 11]  # the king's bitboard has a single bit set
+        if not king:
+            raise NoKingError(c)
+        return self._is_square_attacked(king.bit_length() - 1, 1 if c == 1 else 0)
 
     def castling_criteria(self, king, castle_move):
         """Return true if king can castle"""
@@ -485,9 +637,16 @@ class Board:
 
         possible_moves = collections.defaultdict(list)
         consider = self.get_pieces_left(self._turn)
+        checkers, evasions, xray, pins = self._check_masks(self._turn)
+        enemy_attacks = 0  # the enemy attack map, only built if the king has a move to test
 
         for piece1, pos1 in list(consider.items()):
             pos1x, pos1y = pos1  # = consider[piece1]
+            is_king = isinstance(piece1, King)
+            if checkers and not is_king and not evasions:  # double check, only the king can move
+                continue
+            allowed = pins.get(pos1y * 8 + pos1x, -1)  # a pinned piece can only move along the pin
+
             for e1, e2 in piece1.legal_moves():
                 if not self.is_piece_in_the_way(pos1x, pos1y, e1, e2):
                     piece2 = self._board[e2][e1]  # either None or Piece
@@ -496,22 +655,107 @@ class Board:
                     if (isinstance(piece1, Pawn) and ((isinstance(piece2, Piece) and (e1 == pos1x))
                                                       or (not isinstance(piece2, Piece) and abs(e1 - pos1x) == 1))):
                         continue
-                    if isinstance(piece1, King) and (abs(e1 - pos1x) == 2) and (
-                            not self.castling_criteria(piece1, (e1, e2))):
+                    if is_king and (abs(e1 - pos1x) == 2) and (not self.castling_criteria(piece1, (e1, e2))):
                         continue  # continue if trying to castle but can't
                     if isinstance(piece2, King):  # don't add moves that capture the king
                         continue
 
-                    self.move_piece(pos1, (e1, e2), check=False)  # temporarily make the move
-
-                    if not self.is_in_check(-1 * self._turn):  # add to list if legal
-                        possible_moves[(pos1x, pos1y)].append((e1, e2))
+                    target = 1 << (e2 * 8 + e1)
+                    if is_king:  # the king can't step onto an attacked square
+                        enemy_attacks = enemy_attacks or self._attack_map(1 if self._turn == 1 else 0)
+                        if not target & (enemy_attacks | xray):
+                            possible_moves[(pos1x, pos1y)].append((e1, e2))
+                        continue
 
-                    self.undo_move()  # unmake the temporary move
+                    if not target & evasions & allowed:
+                        continue
+                    possible_moves[(pos1x, pos1y)].append((e1, e2))
 
         self._legal_moves = possible_moves
         return possible_moves
 
+    @Profiler.profile
+    def legal_captures(self) -> list:
+        """Finds the legal captures and pawn promotions for the team whose turn it is (the moves searched by quiescence
+        search). They are read from the attack maps instead of the move lists of the pieces, so this is much cheaper
+        than legal_moves().
+        :return: List of moves ((x1, y1), (x2, y2)), most valuable victim first, then least valuable attacker first"""
+        side = 0 if self._turn == 1 else 1
+        checkers, evasions, xray, pins = self._check_masks(self._turn)
+        b = self._bitboards
+        enemy = self._occupied[1 - side] & ~b[11 - side]  # never capture the king
+        enemy_attacks = self._attack_map(1 - side)
+        occupied = self._occupied[0] | self._occupied[1]
+        empty = ~occupied
+        step = 8 if side == 0 else -8
+        promotion_rank = 0xFF << (48 if side == 0 else 8)  # pawns that promote with a push
+
+        captures = []  # (victim worth, attacker index, from square, to square)
+        for sq in squares(b[10 + side]):  # the king can capture any piece that isn't defended
+            for to in squares(king_attacks[sq] & enemy & ~(enemy_attacks | xray)):
+                captures.append((piece_worth[self._board[to >> 3][to & 7].get_idx()], 10 + side, sq, to))
+
+        if not checkers or evasions:  # in double check only the king can move
+            for idx in range(side, 10, 2):
+                for sq in squares(b[idx]):
+                    targets = self._attacks_from(sq, idx, occupied) & enemy
+                    if idx < 2 and (1 << sq) & promotion_rank:
+                        targets |= (1 << (sq + step)) & empty
+                    for to in squares(targets & evasions & pins.get(sq, -1)):
+                        victim = self._board[to >> 3][to & 7]
+                        worth = piece_worth[victim.get_idx()] if isinstance(victim, Piece) else 0
+                        if idx < 2 and (1 << sq) & promotion_rank:
+                            worth += piece_worth[8] - piece_worth[0]  # promotion to a queen
+                        captures.append((worth, idx, sq, to))
+
+        captures.sort(key=lambda c: (-c[0], c[1]))
+        return [(all_positions[frm], all_positions[to]) for _, _, frm, to in captures]
+
+    def _check_masks(self, c: int):
+        """Find the restrictions that checks and pins put on the moves of team c
+        :param c: the color corresponding to the specified team
+        :return: (bitboard of checking pieces, bitboard of squares that non-king moves must move to (all squares if not
+        in check, the checking piece and the squares between it and the king if in check, none if in double check),
+        bitboard of the squares that are only safe for the king because it blocks the checking piece itself,
+        {key=pinned piece square, val=bitboard of squares it can move to})"""
+        checkers, pins = self._checkers_and_pins(c)
+        if not checkers:
+            return checkers, -1, 0, pins
+
+        king_sq = self._bitboards[10 if c == 1 else 11].bit_length() - 1
+        checker_sq = checkers.bit_length() - 1
+        evasions = checkers | between[king_sq][checker_sq] if checkers & (checkers - 1) == 0 else 0  # 0 if double
+        xray = 0
+        occupied = (self._occupied[0] | self._occupied[1]) & ~(1 << king_sq)
+        for sq in squares(checkers):
+            xray |= self._attacks_from(sq, self._board[sq >> 3][sq & 7].get_idx(), occupied)
+        return checkers, evasions, xray, pins
+
+    def _checkers_and_pins(self, c: int):
+        """Find the enemy pieces giving check to the king of team c, and the pieces of team c pinned to their king
+        :param c: the color corresponding to the specified team
+        :return: (bitboard of checking pieces, {key=pinned piece square, val=bitboard of squares it can move to})"""
+        side = 0 if c == 1 else 1
+        b = self._bitboards
+        king = b[10 + side]
+        if not king:
+            raise NoKingError(c)
+        king_sq = king.bit_length() - 1
+        occupied = self._occupied[0] | self._occupied[1]
+        rooks = b[7 - side] | b[9 - side]  # enemy rooks and queens
+        bishops = b[5 - side] | b[9 - side]  # enemy bishops and queens
+
+        checkers = ((knight_attacks[king_sq] & b[3 - side]) | (pawn_attacks[side][king_sq] & b[1 - side]) |
+                    (rook_attacks(king_sq, occupied) & rooks) | (bishop_attacks(king_sq, occupied) & bishops))
+
+        pins = {}
+        # enemy sliders that would attack the king on an empty board, with exactly one piece of team c in between
+        for sq in squares((rook_attacks(king_sq, 0) & rooks) | (bishop_attacks(king_sq, 0) & bishops)):
+            blockers = between[king_sq][sq] & occupied
+            if blockers and blockers & (blockers - 1) == 0 and blockers & self._occupied[side]:
+                pins[blockers.bit_length() - 1] = between[king_sq][sq] | (1 << sq)
+        return checkers, pins
+
     @Profiler.profile
     def checkmate(self) -> bool:
         """Determines if the current team is in checkmate.
@@ -599,14 +843,134 @@ class Board:
 
         return fen
 
+    def get_fen(self) -> str:
+        """The position in Forsyth-Edwards Notation (the inverse of start_from_fen)
+        :return: The position, ie "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1" at the start"""
+        rows = []
+        for y in range(7, -1, -1):
+            row, empty = "", 0
+            for piece in self._board[y]:
+                if isinstance(piece, Piece):
+                    row += (str(empty) if empty else "") + str(piece)
+                    empty = 0
+                else:
+                    empty += 1
+            rows.append(row + (str(empty) if empty else ""))
+
+        castling = "".join(letter for bit, letter in [(1, "K"), (2, "Q"), (4, "k"), (8, "q")]
+                           if self._castling_rights & bit) or "-"
+        turn = "w" if self._turn == 1 else "b"
+        return f"{'/'.join(rows)} {turn} {castling} - {self.get_moves_since_capture()} {self._move_count // 2 + 1}"
+
     def zobrist_hash_init(self):
-        """Zobrist hashing"""
+        """Zobrist hashing: a key for each piece on each square, for the side to move and for each castling right"""
         self._zobrist_hash = 0
         for x, y in all_positions:
             p = self._board[y][x]
             if isinstance(p, Piece):
                 self._zobrist_hash ^= zobrist_table[y][x][p.get_idx()]
 
-    def _update_zobrist_hash(self, x, y, idx):
-        """Update the zobrist hash when a move is made on the board"""
+        if self._turn == -1:
+            self._zobrist_hash ^= zobrist_turn[0]
+        self._castling_rights = self.get_castling_rights()
+        for i in range(4):
+            if (self._castling_rights >> i) & 1:
+                self._zobrist_hash ^= zobrist_castling[i]
+
+    def get_castling_rights(self) -> int:
+        """:return: The castling rights bits (see castling_positions): the king and the rook weren't moved"""
+        rights = 0
+        for bit, ((kx, ky), (rx, ry)) in castling_positions.items():
+            king, rook = self._board[ky][kx], self._board[ry][rx]
+            if isinstance(king, King) and not king.get_was_moved() and isinstance(rook, Rook) and \
+                    not rook.get_was_moved():
+                rights |= bit
+        return rights
+
+    def _update_castling_rights(self):
+        """Update the castling rights and their keys in the zobrist hash after a move from or to a castling square"""
+        rights = self.get_castling_rights()
+        changed = rights ^ self._castling_rights
+        for i in range(4):
+            if (changed >> i) & 1:
+                self._zobrist_hash ^= zobrist_castling[i]
+        self._castling_rights = rights
+
+    def bitboards_init(self):
+        """Build the bitboards and the evaluation totals from the board array"""
+        self._bitboards = [0] * 12
+        self._occupied = [0, 0]
+        self._attack_maps = [None, None]
+        self._attack_maps_hash = None
+        self._material = [0, 0]
+        self._midgame = [0, 0]
+        self._endgame = [0, 0]
+        self._phase = 0
+        for x, y in all_positions:
+            p = self._board[y][x]
+            if isinstance(p, Piece):
+                self._bitboards[p.get_idx()] |= 1 << (y * 8 + x)
+                self._occupied[p.get_idx() & 1] |= 1 << (y * 8 + x)
+                self._material[p.get_idx() & 1] += piece_worth[p.get_idx()]
+                self._midgame[p.get_idx() & 1] += midgame_tables[p.get_idx()][y][x]
+                self._endgame[p.get_idx() & 1] += endgame_tables[p.get_idx()][y][x]
+                self._phase += phase_weights[p.get_idx()]
+
+    @staticmethod
+    def _attacks_from(sq, idx, occupied):
+        """:return: Bitboard of the squares attacked by a piece of index idx on sq"""
+        kind = idx >> 1  # 0 = pawn, 1 = knight, 2 = bishop, 3 = rook, 4 = queen, 5 = king
+        if kind == 0:
+            return pawn_attacks[idx & 1][sq]
+        elif kind == 1:
+            return knight_attacks[sq]
+        elif kind == 2:
+            return bishop_attacks(sq, occupied)
+        elif kind == 3:
+            return rook_attacks(sq, occupied)
+        elif kind == 4:
+            return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+        return king_attacks[sq]
+
+    def _toggle_piece(self, x, y, idx):
+        """Add or remove a piece of index idx on (x, y): update the zobrist hash, the bitboards and the evaluation when
+        a move is made on the board (the attack maps are rebuilt when next needed, see _attack_map). Every piece leaving
+        or entering a square is toggled exactly once, so xor keeps the hash and bitboards in sync"""
         self._zobrist_hash ^= zobrist_table[y][x][idx]
+        bit = 1 << (y * 8 + x)
+        side = idx & 1
+        self._bitboards[idx] ^= bit
+        self._occupied[side] ^= bit
+        sign = 1 if self._bitboards[idx] & bit else -1  # piece added or removed
+        self._material[side] += sign * piece_worth[idx]
+        self._midgame[side] += sign * midgame_tables[idx][y][x]
+        self._endgame[side] += sign * endgame_tables[idx][y][x]
+        self._phase += sign * phase_weights[idx]
+
+    def evaluate(self, color: int) -> int:
+        """Static evaluation, kept up to date on every move: the worth of a team's pieces minus those of the other team,
+        plus the difference of their piece-square table values tapered between the midgame and endgame tables by the
+        game phase (integer blend, no division)
+        :param color: The team of the side in question
+        :return: The score (positive if the team is winning)"""
+        scale = phase_scale[self._phase]
+        midgame = self._midgame[0] - self._midgame[1]
+        endgame = self._endgame[0] - self._endgame[1]
+        score = self._material[0] - self._material[1] + ((midgame * scale + endgame * (256 - scale)) >> 8)
+        return score if color == 1 else -score  # blend from white's side, so the two teams' scores are exact opposites
+
+    def to_array(self) -> bytes:
+        """Export the position for batch evaluation (see batch_eval.py)
+        :return: 64 bytes, one per square (8 * ypos + xpos): the index of the piece on it, or 12 if it is empty"""
+        array = bytearray(b"\x0c" * 64)
+        for idx in range(12):
+            for sq in squares(self._bitboards[idx]):
+                array[sq] = idx
+        return bytes(array)
+
+    def get_mobility(self, color: int) -> int:
+        """:return: The total number of squares attacked by the pieces of a team (summed over its pieces)"""
+        side = 0 if color == 1 else 1
+        occupied = self._occupied[0] | self._occupied[1]
+        return sum(bin(self._attacks_from(sq, idx, occupied)).count("1")
+                   for idx in range(side, 12, 2) for sq in squares(self._bitboards[idx]))
@@ -2,6 +2,8 @@
 
 import pygame
 from AI import *
+from lazy_smp import LazySMPAI
+from opening_book import OpeningBook
 from pieces import *
 from all_moves import all_positions
 
@@ -66,17 +68,23 @@ class PlayGame:
         ai_team = -1 * side  # Set the ai's side
 
         # Get the desired AI type and define AI
-        ai_types = {0: AI, 1: MinimaxAI, 2: MCTSAI, 3: IterativeDeepeningAI}
-        ai_type = input("Select AI to play against {0: AI, 1: MinimaxAI, 2: MCTSAI, 3: IterativeDeepeningAI}: ")
-        if ai_type == "0" or ai_type == "1" or ai_type == "2" or ai_type == "3":
+        ai_types = {0: AI, 1: MinimaxAI, 2: MCTSAI, 3: IterativeDeepeningAI, 4: LazySMPAI}
+        ai_type = input("Select AI to play against {0: AI, 1: MinimaxAI, 2: MCTSAI, 3: IterativeDeepeningAI, "
+                        "4: LazySMPAI}: ")
+        if ai_type in ("0", "1", "2", "3", "4"):
             ai_type = ai_types[int(ai_type)]
             ai = ai_type(ai_team)  # define the AI
         else:
             raise InvalidAIType(ai_type)
 
+        ai.book = OpeningBook.open_default()  # None until a book is built from the self-play log
         self.board.start_game()  # Starts the game on the board object
         self.initialize_board()  # Initialize the board
-        result = self.master_function(ai)  # Get the game result
+        try:
+            result = self.master_function(ai)  # Get the game result
+        finally:
+            if ai.book is not None:
+                ai.book.close()
 
         Profiler.report()
         print('The winner is: {} !!!'.format(result))  # Print the game result
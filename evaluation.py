@@ -110,6 +110,49 @@ black_bishop_dev = [[-30, -20, -10, -10, -10, -10, -20, -30],
                     [-20, 10, 0, 0, 0, 0, 10, -20],
                     [-30, -20, -10, -10, -10, -10, -20, -30]]
 
+# endgame piece-square tables: pawns are worth more the closer they are to promoting, the king should be centralized,
+# and knight development matters less (the other pieces use the same table in both phases)
+white_pawn_end = [[0, 0, 0, 0, 0, 0, 0, 0],
+                  [10, 10, 10, 10, 10, 10, 10, 10],
+                  [15, 15, 15, 15, 15, 15, 15, 15],
+                  [25, 25, 25, 25, 25, 25, 25, 25],
+                  [40, 40, 40, 40, 40, 40, 40, 40],
+                  [60, 60, 60, 60, 60, 60, 60, 60],
+                  [90, 90, 90, 90, 90, 90, 90, 90],
+                  [0, 0, 0, 0, 0, 0, 0, 0]]
+
+black_pawn_end = white_pawn_end[::-1]
+
+white_king_end = [[-50, -30, -30, -30, -30, -30, -30, -50],
+                  [-30, -30, 0, 0, 0, 0, -30, -30],
+                  [-30, -10, 20, 30, 30, 20, -10, -30],
+                  [-30, -10, 30, 40, 40, 30, -10, -30],
+                  [-30, -10, 30, 40, 40, 30, -10, -30],
+                  [-30, -10, 20, 30, 30, 20, -10, -30],
+                  [-30, -20, -10, 0, 0, -10, -20, -30],
+                  [-50, -40, -30, -20, -20, -30, -40, -50]]
+
+black_king_end = white_king_end[::-1]
+
+white_knight_end = [[v // 2 for v in row] for row in white_knight_dev]
+black_knight_end = [[v // 2 for v in row] for row in black_knight_dev]
+
+# tables indexed by piece index (Piece.get_idx(): white pawn, black pawn, white knight, black knight, ... black king)
+piece_worth = [100, 100, 300, 300, 300, 300, 500, 500, 900, 900, 20000, 20000]
+midgame_tables = [white_pawn_dev, black_pawn_dev, white_knight_dev, black_knight_dev, white_bishop_dev,
+                  black_bishop_dev, white_rook_dev, black_rook_dev, white_queen_dev, black_queen_dev,
+                  white_king_dev, black_king_dev]
+endgame_tables = [white_pawn_end, black_pawn_end, white_knight_end, black_knight_end, white_bishop_dev,
+                  black_bishop_dev, white_rook_dev, black_rook_dev, white_queen_dev, black_queen_dev,
+                  white_king_end, black_king_end]
+
+# game phase: each knight and bishop counts 1, each rook 2 and each queen 4, so the starting position is 24 (midgame)
+# and bare kings and pawns are 0 (endgame). phase_scale maps the phase to a midgame weight out of 256, so the tapered
+# score (midgame * weight + endgame * (256 - weight)) >> 8 needs no division (promotions can push the phase past 24)
+phase_weights = [0, 0, 1, 1, 1, 1, 2, 2, 4, 4, 0, 0]
+max_phase = 24
+phase_scale = [min(phase, max_phase) * 256 // max_phase for phase in range(max_phase + 16 * 4 + 1)]
+
 
 def evaluating(team):
     d = {1: 0, -1: 7}
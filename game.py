@@ -8,6 +8,7 @@
 from board import Board
 from AI import AI, MinimaxAI, MCTSAI
 from profiler import Profiler
+from opening_book import OpeningBook, log_game
 
 
 class InvalidModeError(Exception):
@@ -43,7 +44,7 @@ def letter_pos_to_num_pos(pos: tuple) -> tuple:
 def main():
     winners = []
     for _ in range(1):
-        result = run_game()  # run AI vs AI (change argument to 1 for player vs AI)
+        result = run_game()  # run AI vs AI (pass opening_book.default_log_path to log simulations for the book)
         winners.append(result)
         Profiler.report()
     print("Winners", winners)
@@ -71,19 +72,26 @@ def play_game():
     else:
         raise InvalidAIType(ai_type)
 
+    book = OpeningBook.open_default()  # None until a book is built from the self-play log
+    ai.book = book
     if side == 1:  # [user, ai]
         ai_lis = [None, ai]
     else:  # side == -1,  [ai, user]
         ai_lis = [ai, None]
 
     board.start_game()
-    game_winner = turn(board, ai_lis)  # run the game
+    try:
+        game_winner = turn(board, ai_lis)  # run the game
+    finally:
+        if book is not None:
+            book.close()
     print("the winner is...", game_winner)
     return game_winner
 
 
-def run_simulation():
-    """Run an AI vs AI simulation"""
+def run_simulation(log_path: str = None):
+    """Run an AI vs AI simulation
+    :param log_path: The self-play log to add the game to (see opening_book.log_game), None to not log it"""
     board = Board()
 
     # Get the desired AI type and define AI
@@ -102,24 +110,33 @@ def run_simulation():
     else:
         raise InvalidAIType(ai_type)
 
+    book = OpeningBook.open_default()  # None until a book is built from the self-play log
+    ai_white.book = ai_black.book = book
     ai_lis = [ai_white, ai_black]
 
     board.start_game()
-    game_winner = turn(board, ai_lis)  # run the game
+    try:
+        game_winner = turn(board, ai_lis)  # run the game
+    finally:
+        if book is not None:
+            book.close()
     print("the winner is...", game_winner)
+    if log_path is not None:  # for building the opening book
+        log_game(log_path, board.get_moves(), game_winner)
     return game_winner
     pass
 
 
 @Profiler.profile
-def run_game():
-    """Start a game using num of AI's (1=player vs AI, 2=AI vs AI). Defaults to AI vs AI"""
+def run_game(log_path: str = None):
+    """Start a game using num of AI's (1=player vs AI, 2=AI vs AI). Defaults to AI vs AI
+    :param log_path: The self-play log to add AI vs AI games to, None to not log them"""
     mode = input("number of AI's: (1 to play against AI, 2 for AI vs AI simulation : ")
 
     if mode == "1":
         return play_game()
     elif mode == "2":
-        return run_simulation()
+        return run_simulation(log_path)
     else:
         raise InvalidModeError(mode)
 
@@ -0,0 +1,152 @@
+# lazy_smp.py: parallel search (lazy SMP): worker processes search the same position, sharing a transposition table
+
+#  Each worker process restores its own copy of the board from a snapshot of the position and runs iterative deepening
+#  on it, odd workers one ply deeper than even ones, so they explore the tree in a different order. The workers share
+#  only the transposition table (in shared memory), which is what makes them cooperate: a position searched by one
+#  worker is a cutoff or a well-ordered node for the others. The best move is taken from the deepest completed search.
+
+import os
+import time
+import queue
+import multiprocessing
+from AI import IterativeDeepeningAI
+from board import Board
+from time_manager import TimeManager, SearchTimeout
+from transposition import SharedTranspositionTable
+
+
+class WorkerClock:
+
+    def __init__(self, stop, deadline: float = None, budget: float = None, check_every: int = 256):
+        """Takes the place of the TimeManager in a worker: aborts the search when the main process tells the workers
+        to stop, or when the time for the move is up
+        :param stop: multiprocessing.Event set by the main process to stop the workers
+        :param deadline: The time (time.time()) the search must stop by, or None for no deadline
+        :param budget: The time budget for the move in seconds, or None for no budget
+        :param check_every: The number of checks between looks at the stop event and the clock"""
+        self._stop = stop
+        self._deadline = deadline
+        self._budget = budget
+        self._start = time.time()
+        self._check_every = check_every
+        self._checks = 0
+
+    def can_start_iteration(self) -> bool:
+        """:return: True if less than half of the budget is used (see TimeManager.can_start_iteration)"""
+        return not self._stop.is_set() and (self._budget is None or time.time() - self._start < self._budget / 2)
+
+    def check(self):
+        """Called at every node of the search: raise SearchTimeout if the workers were told to stop or out of time"""
+        self._checks += 1
+        if self._checks % self._check_every == 0:
+            if self._stop.is_set() or (self._deadline is not None and time.time() > self._deadline):
+                raise SearchTimeout()
+
+
+def search_worker(worker_id: int, board_type, snapshot: bytes, team: int, max_depth: int, tt_array, tt_age: int,
+                  results, stop, deadline: float = None, budget: float = None):
+    """Run iterative deepening in a worker process, putting (worker id, depth, move, score, nodes) on the results queue
+    after each completed depth and (worker id, None, None, None, nodes) when done
+    :param worker_id: The number of the worker (odd workers search one ply deeper)
+    :param board_type: Board or BitBoard
+    :param snapshot: The position to search (Board.snapshot())
+    :param team: The team of the AI
+    :param max_depth: The deepest depth to search to (one more for odd workers)
+    :param tt_array: The shared array of the transposition table
+    :param tt_age: The search generation of the transposition table
+    :param results: multiprocessing.Queue for the results
+    :param stop: multiprocessing.Event set by the main process to stop the workers
+    :param deadline: The time (time.time()) the search must stop by, or None for no deadline
+    :param budget: The time budget for the move in seconds, or None for no budget"""
+    board = board_type()
+    board.restore(snapshot)
+    ai = IterativeDeepeningAI(team)
+    ai.tt = SharedTranspositionTable(array=tt_array, age=tt_age)
+    ai.time_manager = WorkerClock(stop, deadline, budget)
+
+    result = None
+    offset = worker_id % 2  # staggered depths
+    for depth in range(1 + offset, max_depth + offset + 1):
+        if result is not None and not ai.time_manager.can_start_iteration():
+            break
+        try:
+            result = ai.aspiration_search(board, depth, None if result is None else result[1])
+        except SearchTimeout:
+            break
+        results.put((worker_id, depth, result[0], result[1], ai.stats.nodes + ai.stats.quiescence_nodes))
+    results.put((worker_id, None, None, None, ai.stats.nodes + ai.stats.quiescence_nodes))
+
+
+class LazySMPAI(IterativeDeepeningAI):
+
+    def __init__(self, color: int, num_workers: int = None, tt_size_mb: float = 16, time_manager: TimeManager = None):
+        """An AI that searches with a worker process per CPU core
+        :param color: The team of the AI
+        :param num_workers: The number of worker processes (defaults to the number of CPU cores)
+        :param tt_size_mb: The size of the shared transposition table in megabytes
+        :param time_manager: The AI's game clock, None to play without a clock"""
+        super().__init__(color, None, time_manager)  # no table of its own: the workers share self.tt
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.tt = SharedTranspositionTable(tt_size_mb)
+
+    def parallel_search(self, board: Board, depth: int, budget: float = None):
+        """Search a position with all of the workers. Without a budget, the search ends as soon as a worker completes
+        depth; with one, when the workers run out of time.
+        :param board: The board to search (it isn't changed)
+        :param depth: The depth to search to
+        :param budget: The time budget in seconds, or None to search to depth
+        :return: A tuple with best move and best evaluation"""
+        self.tt.new_search()
+        start = time.time()
+        deadline = None if budget is None else start + budget
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        workers = [multiprocessing.Process(target=search_worker, daemon=True,
+                                           args=(i, type(board), board.snapshot(), self._team, depth,
+                                                 self.tt.get_array(), self.tt.get_age(), results, stop,
+                                                 deadline, budget))
+                   for i in range(self.num_workers)]
+        for worker in workers:
+            worker.start()
+
+        best = None  # (depth, move, score) of the deepest completed search
+        nodes = {}
+        done = 0
+        while done < self.num_workers:
+            try:
+                worker_id, d, move, score, n = results.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):  # a worker died without reporting
+                    break
+                continue
+            nodes[worker_id] = n
+            if d is None:
+                done += 1
+            elif best is None or d > best[0]:
+                best = (d, move, score)
+                print('iter depth', d, (move, score), 'worker', worker_id)
+                if d >= depth:  # deep enough: stop the other workers
+                    stop.set()
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+        sec = time.time() - start
+        print(f"workers {self.num_workers}  nodes {sum(nodes.values())}  nps {sum(nodes.values()) / sec:.0f}")
+        if best is None:  # out of time before any search finished
+            return self.orderer.order_moves(board, self.format_legal_moves(board), 0)[0], 0
+        return best[1], best[2]
+
+    def make_move(self, board: Board):
+        """Choose a move for the AI to make with the parallel search and make the move. Takes as input a board object"""
+        if self.play_book_move(board):
+            return
+        if self.time_manager is None:
+            start_pos, end_pos = self.parallel_search(board, self.max_depth)[0]
+        else:
+            budget = self.time_manager.start(board.get_current_move_count())
+            start_pos, end_pos = self.parallel_search(board, self.max_time_depth, budget)[0]
+            self.time_manager.stop()
+        board.move_piece(start_pos, end_pos)  # move using chess letter notation
+        print(f"moving from {start_pos} to {end_pos}")
+        print(board)
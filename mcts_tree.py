@@ -0,0 +1,189 @@
+# mcts_tree.py: the search tree of MCTS, stored as parallel lists indexed by node number
+
+#  A node is a number, and its move, parent, children, visits, total and depth are entries of parallel lists, so the
+#  tree is a handful of lists however many nodes it holds (no object per node). The children of a node are added
+#  together when it is expanded, so they are a contiguous block of numbers (first child, number of children).
+#  Selection loops over that block with the parent's log(visits) computed once, and backpropagation walks the parent
+#  list up to the root (no recursion). Cutting branches or re-rooting the tree copies the nodes that are kept to new
+#  lists, in breadth first order, which keeps every block of children contiguous.
+
+import math
+import random
+
+root_node = 0  # the number of the root node
+
+
+class MCTSTree:
+
+    def __init__(self, max_depth: int = 2, exploration: float = 400):
+        """An MCTS tree with only a root node
+        :param max_depth: Nodes deeper than this aren't expanded
+        :param exploration: The exploration constant of the selection policy (UCB1)"""
+        self.max_depth = max_depth
+        self.exploration = exploration
+        self.moves = [None]  # move from parent to node
+        self.parents = [-1]  # parent node (-1 for the root)
+        self.first_child = [0]  # the children of a node are first_child ... first_child + num_children - 1
+        self.num_children = [0]
+        self.visits = [0]
+        self.totals = [0]  # total of the simulation results;  score = total / visits
+        self.depths = [0]
+
+    def __len__(self):
+        return len(self.moves)
+
+    def is_leaf(self, node: int) -> bool:
+        return self.num_children[node] == 0
+
+    def children(self, node: int) -> range:
+        """:return: The numbers of the children of a node"""
+        return range(self.first_child[node], self.first_child[node] + self.num_children[node])
+
+    def find_child(self, node: int, move) -> int:
+        """:return: The child of a node reached by a move, or -1 if it has none"""
+        for child in self.children(node):
+            if self.moves[child] == move:
+                return child
+        return -1
+
+    def select(self, node: int) -> int:
+        """Choose a child of a node using the selection policy formula (an unvisited child first, ties at random)
+        :return: The chosen child"""
+        visits, totals = self.visits, self.totals
+        log_visits = math.log(visits[node]) if visits[node] else 0.0
+        c = self.exploration
+        best, best_score = [], -float('inf')
+        for child in self.children(node):
+            n = visits[child]
+            s = float('inf') if n == 0 else totals[child] / n + c * math.sqrt(log_visits / n)
+            if s > best_score:
+                best, best_score = [child], s
+            elif s == best_score:
+                best.append(child)
+        return best[0] if len(best) == 1 else random.choice(best)
+
+    def expand(self, node: int, moves: list, child: int = None) -> int:
+        """Add a child for every legal move of a node
+        :param node: The node to expand
+        :param moves: The legal moves in the node's position
+        :param child: The index in moves of the child to return, None for a random child
+        :return: The child, or the node itself if it is too deep or the game is over"""
+        if self.depths[node] > self.max_depth or not moves:
+            return node
+
+        first, depth = len(self.moves), self.depths[node] + 1
+        self.first_child[node], self.num_children[node] = first, len(moves)
+        self.moves.extend(moves)
+        self.parents.extend([node] * len(moves))
+        self.first_child.extend([0] * len(moves))
+        self.num_children.extend([0] * len(moves))
+        self.visits.extend([0] * len(moves))
+        self.totals.extend([0] * len(moves))
+        self.depths.extend([depth] * len(moves))
+        return first + (random.randrange(len(moves)) if child is None else child)  # random node
+
+    def backpropagate(self, node: int, result, count: int = 1):
+        """Add simulation results to a node and every node above it
+        :param node: The node simulated from
+        :param result: The total of the results
+        :param count: The number of simulations"""
+        visits, totals, parents = self.visits, self.totals, self.parents
+        while node != -1:
+            visits[node] += count
+            totals[node] += result
+            node = parents[node]
+
+    def select_leaf(self, virtual_loss: float) -> tuple:
+        """Walk down from the root to a leaf with select, for tree-parallel search (see tree_parallel.py): each node on
+        the way gets a visit and a virtual loss, so the other workers are steered to other branches until the result of
+        the simulation is added with backpropagate_virtual
+        :param virtual_loss: The amount taken off the total of each node on the way
+        :return: A tuple with the leaf and whether it should be expanded (it was visited before)"""
+        visits, totals = self.visits, self.totals
+        node = root_node
+        while True:
+            expand = visits[node] != 0 and self.depths[node] <= self.max_depth
+            visits[node] += 1
+            totals[node] -= virtual_loss
+            if self.is_leaf(node):
+                return node, expand
+            node = self.select(node)
+
+    def backpropagate_virtual(self, node: int, result, virtual_loss: float):
+        """Add the result of a simulation from a leaf chosen with select_leaf to it and every node above it, taking back
+        the virtual loss (the visits were already added)
+        :param node: The leaf
+        :param result: The result of the simulation
+        :param virtual_loss: The virtual loss the leaf was selected with"""
+        totals, parents = self.totals, self.parents
+        while node != -1:
+            totals[node] += result + virtual_loss
+            node = parents[node]
+
+    def path(self, node: int) -> list:
+        """:return: The moves from the root to a node"""
+        moves = []
+        while node != root_node:
+            moves.append(self.moves[node])
+            node = self.parents[node]
+        return moves[::-1]
+
+    def root_stats(self) -> dict:
+        """:return: {key=move, val=(visits, total)} for the children of the root"""
+        return {self.moves[child]: (self.visits[child], self.totals[child]) for child in self.children(root_node)}
+
+    def _rebuild(self, new_root: int):
+        """Keep only the subtree under new_root, renumbering its nodes in breadth first order (new_root becomes 0)"""
+        order = [new_root]
+        for node in order:  # the list grows while it is walked
+            order.extend(self.children(node))
+        number = {old: new for new, old in enumerate(order)}
+
+        depth = self.depths[new_root]
+        self.moves = [self.moves[old] if old != new_root else None for old in order]
+        self.parents = [number.get(self.parents[old], -1) if old != new_root else -1 for old in order]
+        self.first_child = [number[self.first_child[old]] if self.num_children[old] else 0 for old in order]
+        self.num_children = [self.num_children[old] for old in order]
+        self.visits = [self.visits[old] for old in order]
+        self.totals = [self.totals[old] for old in order]
+        self.depths = [self.depths[old] - depth for old in order]
+
+    def make_root(self, node: int):
+        """Keep only the subtree under a node and make it the root, for the next search (see MCTSAI.reuse_tree)"""
+        self._rebuild(node)
+
+    def prune(self, max_nodes: int) -> int:
+        """Cut the subtrees under the least visited nodes (their own statistics are kept) until the tree has at most
+        max_nodes nodes
+        :param max_nodes: The number of nodes to keep
+        :return: The number of nodes left"""
+        size = [1] * len(self)  # size of the subtree under each node
+        for node in range(len(self) - 1, 0, -1):  # children are numbered after their parents
+            size[self.parents[node]] += size[node]
+
+        num_nodes = size[root_node]
+        # fewer visits first: a node has no more visits than its parent, so subtrees are cut from the bottom up
+        for node in sorted((n for n in range(1, len(self)) if self.num_children[n]), key=self.visits.__getitem__):
+            if num_nodes <= max_nodes:
+                break
+            if not self.num_children[node] or size[node] == 0:  # already cut with a subtree above it
+                continue
+            num_nodes -= size[node] - 1
+            parent = self.parents[node]
+            while parent != -1:
+                size[parent] -= size[node] - 1
+                parent = self.parents[parent]
+            for child in self.children(node):
+                self._mark_cut(child, size)
+            self.num_children[node] = 0
+            size[node] = 1
+        self._rebuild(root_node)
+        return len(self)
+
+    def _mark_cut(self, node: int, size: list):
+        """Mark the nodes of a subtree as cut (size 0)"""
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            size[n] = 0
+            stack.extend(self.children(n))
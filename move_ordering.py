@@ -0,0 +1,89 @@
+# move_ordering.py: orders the moves of a position so alpha-beta search tries the likely best moves first
+
+#  Order: the transposition table move, then captures and promotions by most valuable victim / least valuable attacker
+#  (MVV-LVA), then the two killer moves of the ply (quiet moves that caused a beta cutoff at the same ply elsewhere in
+#  the tree), then the remaining quiet moves by their history score (how often and how deep they caused cutoffs).
+
+from evaluation import piece_worth
+
+tt_move_score = 1 << 30
+capture_score = 1 << 28  # captures and promotions, plus the MVV-LVA score
+killer_score = 1 << 26  # first killer, the second killer is one less
+history_limit = 1 << 20  # history scores are halved when one reaches this, so they stay below the killers
+
+
+class MoveOrderer:
+
+    def __init__(self, max_ply: int = 64):
+        """Keeps the killer moves and the history table between searches
+        :param max_ply: The deepest ply (moves from the root) killer moves are kept for"""
+        self.max_ply = max_ply
+        self.killers = [[None, None] for _ in range(max_ply)]  # two killer moves per ply
+        self.history = [[0] * 4096, [0] * 4096]  # [white, black] cutoff score by from square * 64 + to square
+
+    def new_search(self):
+        """Start a new search: killer moves are for other plies now, and old history counts less"""
+        self.killers = [[None, None] for _ in range(self.max_ply)]
+        self.history = [[h >> 1 for h in side] for side in self.history]
+
+    @staticmethod
+    def _history_index(move) -> int:
+        (x1, y1), (x2, y2) = move
+        return (y1 * 8 + x1) * 64 + y2 * 8 + x2
+
+    @staticmethod
+    def mvv_lva(board, move) -> int:
+        """Score a capture or promotion: the worth of the captured piece (and promotion), then the cheapest attacker
+        :return: The score (0 for a quiet move)"""
+        piece = board.get_piece_from_position(move[0])
+        victim = board.get_piece_from_position(move[1])
+        gain = 0 if victim is None else piece_worth[victim.get_idx()]
+        if piece.get_idx() < 2 and move[1][1] in (0, 7):  # promotion to a queen
+            gain += piece_worth[8] - piece_worth[0]
+        if gain == 0:
+            return 0
+        return gain * 16 - (piece.get_idx() >> 1)  # piece.get_idx() >> 1: 0 = pawn, ... 5 = king
+
+    def order_moves(self, board, moves: list, ply: int, tt_move=None) -> list:
+        """Sort moves, best first
+        :param board: The board the moves are for
+        :param moves: List of moves ((x1, y1), (x2, y2))
+        :param ply: The number of moves from the root of the search
+        :param tt_move: The best move stored in the transposition table for the position, or None
+        :return: The sorted list of moves"""
+        killers = self.killers[ply] if ply < self.max_ply else [None, None]
+        history = self.history[0 if board.get_current_turn() == 1 else 1]
+        scores = {}
+        for move in moves:
+            if move == tt_move:
+                scores[move] = tt_move_score
+                continue
+            mvv_lva = self.mvv_lva(board, move)
+            if mvv_lva:
+                scores[move] = capture_score + mvv_lva
+            elif move == killers[0]:
+                scores[move] = killer_score
+            elif move == killers[1]:
+                scores[move] = killer_score - 1
+            else:
+                scores[move] = history[self._history_index(move)]
+        return sorted(moves, key=scores.__getitem__, reverse=True)
+
+    def update(self, board, move, depth: int, ply: int):
+        """Record a move that caused a beta cutoff (the move must not be made on the board). Quiet moves become the
+        first killer move of the ply and get depth squared added to their history score.
+        :param board: The board the move is for
+        :param move: The move ((x1, y1), (x2, y2))
+        :param depth: The remaining depth the move was searched to
+        :param ply: The number of moves from the root of the search"""
+        if self.mvv_lva(board, move):  # captures are already ordered well
+            return
+
+        if ply < self.max_ply and self.killers[ply][0] != move:
+            self.killers[ply] = [move, self.killers[ply][0]]
+
+        history = self.history[0 if board.get_current_turn() == 1 else 1]
+        i = self._history_index(move)
+        history[i] += depth * depth
+        if history[i] >= history_limit:
+            self.history = [[h >> 1 for h in side] for side in self.history]
@@ -0,0 +1,195 @@
+# opening_book.py: an opening book: moves to play in the positions of earlier games, found without a search
+
+#  A book is a binary file of 16-byte entries in the layout of Polyglot books: key (the zobrist hash of the position,
+#  8 bytes), move (2 bytes), weight (2 bytes) and learn (4 bytes, unused), big-endian and sorted by key. The file is
+#  memory-mapped, so opening a book reads nothing, and the entries of a position are found by binary search on the
+#  key. The keys are Board.get_zobrist_hash() values, so a book works only with the zobrist keys it was built with
+#  (see all_moves.save_zobrist_keys), and castling is stored as the king moving two squares (not as Polyglot's king
+#  takes rook).
+#  Books are built from self-play logs: a text file with a game per line, the result (Board.winner()) then the moves,
+#  ie "3 e2e4 e7e5 ...". Run this module to build a book from a log.
+
+import os
+import mmap
+import random
+import struct
+import argparse
+from board import Board
+
+entry = struct.Struct(">QHHI")  # key, move, weight, learn
+default_book_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Results", "opening_book.bin")
+default_log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Results", "self_play.txt")
+
+
+class OpeningBookError(Exception):
+
+    def __init__(self, path, reason):
+        super().__init__(f"Invalid opening book {path}: {reason}")
+
+
+def encode_move(move: tuple) -> int:
+    """Encode a move ((x1, y1), (x2, y2)) in 12 bits like Polyglot: to file, to row, from file, from row (3 bits each)
+    :return: The encoded move"""
+    (x1, y1), (x2, y2) = move
+    return x2 | (y2 << 3) | (x1 << 6) | (y1 << 9)
+
+
+def decode_move(code: int) -> tuple:
+    """:return: The move ((x1, y1), (x2, y2)) encoded by encode_move"""
+    return ((code >> 6) & 7, (code >> 9) & 7), (code & 7, (code >> 3) & 7)
+
+
+def move_to_text(move: tuple) -> str:
+    """:return: A move ((x1, y1), (x2, y2)) in coordinate notation, ie "e2e4" """
+    (x1, y1), (x2, y2) = move
+    return f"{chr(x1 + 97)}{y1 + 1}{chr(x2 + 97)}{y2 + 1}"
+
+
+def text_to_move(text: str) -> tuple:
+    """:return: The move ((x1, y1), (x2, y2)) of a move in coordinate notation, ie "e2e4" """
+    return (ord(text[0]) - 97, int(text[1]) - 1), (ord(text[2]) - 97, int(text[3]) - 1)
+
+
+class OpeningBook:
+
+    def __init__(self, path: str, max_plies: int = 16):
+        """Open a book file (memory-mapped, it stays open until close(), or the end of a with block)
+        :param path: The book file
+        :param max_plies: The book is only used in the first max_plies plies of a game"""
+        self.path = path
+        self.max_plies = max_plies
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size % entry.size != 0:
+            self._file.close()
+            raise OpeningBookError(path, f"its size ({size} bytes) isn't a multiple of {entry.size} bytes")
+        self._size = size // entry.size
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+
+    @staticmethod
+    def open_default(max_plies: int = 16):
+        """:return: The book at default_book_path, or None if no book was built"""
+        if not os.path.exists(default_book_path):
+            return None
+        return OpeningBook(default_book_path, max_plies)
+
+    def __len__(self):
+        return self._size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the book file"""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def probe(self, key: int) -> list:
+        """Find the book moves of a position
+        :param key: The zobrist hash of the position (Board.get_zobrist_hash())
+        :return: List of (move, weight) for the position, empty if it isn't in the book"""
+        lo, hi = 0, self._size
+        while lo < hi:  # the first entry with a key >= key
+            mid = (lo + hi) // 2
+            if entry.unpack_from(self._data, mid * entry.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        moves = []
+        for i in range(lo, self._size):
+            k, move, weight, _ = entry.unpack_from(self._data, i * entry.size)
+            if k != key:
+                break
+            moves.append((decode_move(move), weight))
+        return moves
+
+    def choose(self, board: Board):
+        """Make a weighted choice of a book move for the position
+        :param board: The board
+        :return: The move ((x1, y1), (x2, y2)), or None if the game is past max_plies or the position has no legal book
+        moves"""
+        if board.get_current_move_count() >= self.max_plies:
+            return None
+        legal = board.legal_moves()  # a book move is checked in case two positions share a hash
+        moves = [(move, weight) for move, weight in self.probe(board.get_zobrist_hash())
+                 if weight > 0 and move[1] in legal.get(move[0], ())]
+        if not moves:
+            return None
+        return random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def log_game(path: str, moves: list, result: int):
+    """Add a game to a self-play log
+    :param path: The log file
+    :param moves: The moves of the game from the starting position
+    :param result: The result of the game (Board.winner())"""
+    with open(path, "a") as f:
+        f.write(" ".join([str(result)] + [move_to_text(move) for move in moves]) + "\n")
+
+
+def read_log(path: str):
+    """Iterate over the games of a self-play log
+    :return: (result, list of moves) for each game"""
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                yield int(fields[0]), [text_to_move(text) for text in fields[1:]]
+
+
+def write_book(path: str, weights: dict) -> int:
+    """Write a book file
+    :param path: The book file
+    :param weights: {key=(zobrist hash, move), val=weight}
+    :return: The number of entries written"""
+    scale = max(1.0, max(weights.values(), default=0) / 0xFFFF)  # weights are 16 bits
+    entries = sorted((key, encode_move(move), max(1, round(weight / scale)))
+                     for (key, move), weight in weights.items() if weight > 0)
+    with open(path, "wb") as f:
+        for key, move, weight in entries:
+            f.write(entry.pack(key, move, weight, 0))
+    return len(entries)
+
+
+def build_book(log_path: str, book_path: str, max_plies: int = 16, board_type=Board) -> int:
+    """Build a book from a self-play log. Like Polyglot, a move scores 2 when its side won the game, 1 when the game
+    was drawn and 0 when its side lost; a move's weight is its total score over the games.
+    :param log_path: The self-play log (see log_game)
+    :param book_path: The book file to write
+    :param max_plies: The number of moves of each game to add to the book
+    :param board_type: Board or BitBoard, to replay the games
+    :return: The number of entries written"""
+    weights = {}  # {key=(zobrist hash, move), val=weight}
+    for result, moves in read_log(log_path):
+        winner = 0 if abs(result) != 3 else (1 if result > 0 else -1)  # only checkmate is a win (see Board.winner)
+        board = board_type()
+        board.start_game()
+        for move in moves[:max_plies]:
+            score = 1 if winner == 0 else (2 if winner == board.get_current_turn() else 0)
+            key = (board.get_zobrist_hash(), move)
+            weights[key] = weights.get(key, 0) + score
+            board.move_piece(move[0], move[1])
+    return write_book(book_path, weights)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from a self-play log")
+    parser.add_argument("--log", default=default_log_path, help="self-play log to read")
+    parser.add_argument("--book", default=default_book_path, help="book file to write")
+    parser.add_argument("--plies", type=int, default=16, help="moves of each game to add to the book")
+    args = parser.parse_args()
+    n = build_book(args.log, args.book, args.plies)
+    print(f"wrote {n} entries to {args.book}")
+
+
+if __name__ == "__main__":
+    main()
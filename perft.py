@@ -0,0 +1,128 @@
+# perft.py: move generation benchmark and correctness test (perft: count the leaf nodes of the game tree to a depth)
+
+#  The reference counts are the published perft results, at depths where they don't include en passant captures or
+#  under-promotions (the board doesn't support en passant and always promotes to a queen). Where a published count only
+#  includes them at the leaves, those leaves are subtracted (kiwipete depth 2: 2039 - 1 en passant, endgame depth 3:
+#  2812 - 2 en passant, promotions depth 2: 264 - 36 under-promotions).
+#  Run: python perft.py --depth 4 [--board bitboard] [--divide] [--fen "<position>"]
+
+import argparse
+import time
+from board import Board
+from bitboard import BitBoard
+
+start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# name: (fen, {key=depth, val=number of leaf nodes})
+reference_positions = {
+    "start": (start_fen, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    # kiwipete depth 2: 2039 - 1 en passant
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", {1: 48, 2: 2038}),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {1: 14, 2: 191, 3: 2810}),
+    "promotions": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", {1: 6, 2: 228}),
+    "promotions_mirrored": ("r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", {1: 6, 2: 228}),
+}
+
+boards = {"board": Board, "bitboard": BitBoard}
+
+
+def move_to_str(pos1: tuple, pos2: tuple) -> str:
+    """Converts a move like ((4, 1), (4, 3)) to e2e4"""
+    return f"{chr(pos1[0] + 97)}{pos1[1] + 1}{chr(pos2[0] + 97)}{pos2[1] + 1}"
+
+
+def perft(board, depth: int) -> int:
+    """Count the leaf nodes of the game tree from the current position to a specified depth
+    :param board: The board (Board or BitBoard)
+    :param depth: The number of moves (plies) to look ahead
+    :return: The number of leaf nodes"""
+    if depth == 0:
+        return 1
+
+    moves = [(pos1, pos2) for pos1, lis in board.legal_moves().items() for pos2 in lis]
+    if depth == 1:  # bulk counting: the number of legal moves is the number of leaves
+        return len(moves)
+
+    nodes = 0
+    for pos1, pos2 in moves:
+        board.move_piece(pos1, pos2, check=False)
+        nodes += perft(board, depth - 1)
+        board.undo_move()
+    return nodes
+
+
+def divide(board, depth: int) -> dict:
+    """Run perft for each root move separately and print the count for each move (to find which move is wrong when
+    the total doesn't match)
+    :return: {key=move string, val=number of leaf nodes}"""
+    counts = {}
+    for pos1, lis in list(board.legal_moves().items()):
+        for pos2 in lis:
+            board.move_piece(pos1, pos2, check=False)
+            counts[move_to_str(pos1, pos2)] = perft(board, depth - 1)
+            board.undo_move()
+
+    for move in sorted(counts):
+        print(f"{move}: {counts[move]}")
+    print(f"\nMoves: {len(counts)}  Nodes: {sum(counts.values())}")
+    return counts
+
+
+def run_perft(board_type, fen: str, depth: int, expected: dict = None) -> bool:
+    """Run perft from a position for depths 1 to depth, printing node counts and nodes per second
+    :param board_type: Board or BitBoard
+    :param fen: The position in Forsyth-Edwards Notation
+    :param depth: The deepest depth to search
+    :param expected: {key=depth, val=reference leaf count}, to check the counts against
+    :return: True if all counts with a reference count match it"""
+    board = board_type()
+    board.start_from_fen(fen)
+    passed = True
+    for d in range(1, depth + 1):
+        start = time.time()
+        nodes = perft(board, d)
+        sec = time.time() - start
+        nps = nodes / sec if sec > 0 else float('inf')
+
+        result = ""
+        if expected is not None and d in expected:
+            if nodes == expected[d]:
+                result = "ok"
+            else:
+                result = f"MISMATCH (expected {expected[d]})"
+                passed = False
+        print(f'{d:5d} {nodes:12d} {sec:10.3f} {nps:12.0f}  {result}')
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count leaf nodes of the game tree (perft)")
+    parser.add_argument("--depth", type=int, default=3, help="depth to search")
+    parser.add_argument("--board", choices=list(boards), default="board", help="board implementation to test")
+    parser.add_argument("--fen", help="position to search (defaults to the reference positions)")
+    parser.add_argument("--divide", action="store_true", help="print the leaf count of each root move")
+    args = parser.parse_args()
+
+    board_type = boards[args.board]
+    if args.divide:
+        board = board_type()
+        board.start_from_fen(args.fen or start_fen)
+        divide(board, args.depth)
+        return
+
+    if args.fen:
+        positions = {"fen": (args.fen, {})}
+    else:
+        positions = reference_positions
+
+    all_passed = True
+    for name, (fen, expected) in positions.items():
+        print(f"{name}: {fen}")
+        print("Depth        Nodes     TotSec          NPS")
+        all_passed = run_perft(board_type, fen, args.depth, expected) and all_passed
+        print()
+    print("all reference counts match" if all_passed else "some reference counts DON'T match")
+
+
+if __name__ == "__main__":
+    main()
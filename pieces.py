@@ -14,15 +14,32 @@ class InvalidMoveError(Exception):
 
 class Piece:
 
+    # pieces are created by the thousand in searches and snapshots: keep only what differs between two pieces of the same
+    # type on the instance, everything else is shared on the class
+    __slots__ = ("_xpos", "_ypos", "_color", "num_moves", "_idx", "_moves")
+    _worth = 1
+    _names = ('piece', 'piece')  # the all_legal_moves_dict key of a white and a black piece
+    _indices = (-1, -1)  # the piece index of a white and a black piece
+    _evals = (None, None)  # the piece-square table of a white and a black piece
+    _all_legal_moves = all_legal_moves_dict
+
     def __init__(self, xpos, ypos, color: int):
+        side = 0 if color == 1 else 1
         self._xpos = xpos
         self._ypos = ypos
         self._color = color
-        self._worth = 1
         self.num_moves = 0  # number of times piece was moved
-        self._all_legal_moves = all_legal_moves_dict
-        self._name = 'piece'
-        self._idx = -1
+        self._idx = self._indices[side]
+        self._moves = self._all_legal_moves.get(self._names[side])  # {key=ypos, value={key=xpos, value=[moves]}}
+
+    @property
+    def _name(self):
+        return self._names[0 if self._color == 1 else 1]
+
+    @property
+    def eval(self):
+        """:return the piece-square table of the piece"""
+        return self._evals[0 if self._color == 1 else 1]
 
     def get_color(self):
         """:return the color of the piece"""
@@ -64,11 +81,11 @@ class Piece:
     def legal_moves(self):
         """Returns a list of legal moves for that piece based only on the restrictions for the piece type itself
         Inherited by all of the pieces to evaluate each piece's respective criteria"""
-        return self._all_legal_moves[self._name][self._ypos][self._xpos]
+        return self._moves[self._ypos][self._xpos]
 
     def can_move_to(self, new_xpos, new_ypos):
         """Return true if piece can move to (new_xpos, new_ypos), false otherwise"""
-        return (new_xpos, new_ypos) in self._all_legal_moves[self._name][self._ypos][self._xpos]
+        return (new_xpos, new_ypos) in self._moves[self._ypos][self._xpos]
 
     def revert(self, last_xpos, last_ypos):
         """revert a piece back to its previous position (new_xpos, new_ypos). Decrement the was_moved variable"""
@@ -79,17 +96,11 @@ class Piece:
 
 class Pawn(Piece):
 
-    def __init__(self, xpos, ypos, color):
-        super().__init__(xpos, ypos, color)
-        self._worth = 100
-        if color == 1:
-            self._name = 'white_pawn'
-            self.eval = white_pawn_dev
-            self._idx = 0
-        else:
-            self._name = 'black_pawn'
-            self.eval = black_pawn_dev
-            self._idx = 1
+    __slots__ = ()
+    _worth = 100
+    _names = ('white_pawn', 'black_pawn')
+    _indices = (0, 1)
+    _evals = (white_pawn_dev, black_pawn_dev)
 
     def pawn_first_move(self, new_xpos, new_ypos):
         """Returns true if pawn is trying to move 2 spaces for first move"""
@@ -110,16 +121,11 @@ class Pawn(Piece):
 
 class Knight(Piece):
 
-    def __init__(self, xpos, ypos, color):
-        super().__init__(xpos, ypos, color)
-        self._worth = 300
-        self._name = 'knight'
-        if color == 1:
-            self.eval = white_knight_dev
-            self._idx = 2
-        else:
-            self.eval = black_knight_dev
-            self._idx = 3
+    __slots__ = ()
+    _worth = 300
+    _names = ('knight', 'knight')
+    _indices = (2, 3)
+    _evals = (white_knight_dev, black_knight_dev)
 
     def criteria(self, x, y):
         """Return true if move to (x, y) fulfills criteria for specific piece based on current position and piece itself
@@ -136,16 +142,11 @@ class Knight(Piece):
 
 class Bishop(Piece):
 
-    def __init__(self, xpos, ypos, color):
-        super().__init__(xpos, ypos, color)
-        self._worth = 300
-        self._name = 'bishop'
-        if color == 1:
-            self.eval = white_bishop_dev
-            self._idx = 4
-        else:
-            self.eval = black_bishop_dev
-            self._idx = 5
+    __slots__ = ()
+    _worth = 300
+    _names = ('bishop', 'bishop')
+    _indices = (4, 5)
+    _evals = (white_bishop_dev, black_bishop_dev)
 
     def criteria(self, x, y):
         """Return true if move to (x, y) fulfills criteria for specific piece based on current position and piece itself
@@ -161,16 +162,11 @@ class Bishop(Piece):
 
 class Rook(Piece):
 
-    def __init__(self, xpos, ypos, color):
-        super().__init__(xpos, ypos, color)
-        self._worth = 500
-        self._name = 'rook'
-        if color == 1:
-            self.eval = white_rook_dev
-            self._idx = 6
-        else:
-            self.eval = black_rook_dev
-            self._idx = 7
+    __slots__ = ()
+    _worth = 500
+    _names = ('rook', 'rook')
+    _indices = (6, 7)
+    _evals = (white_rook_dev, black_rook_dev)
 
     def criteria(self, x, y):
         """Return true if move to (x, y) fulfills criteria for specific piece based on current position and piece itself
@@ -186,16 +182,11 @@ class Rook(Piece):
 
 class Queen(Piece):
 
-    def __init__(self, xpos, ypos, color):
-        super().__init__(xpos, ypos, color)
-        self._worth = 900
-        self._name = 'queen'
-        if color == 1:
-            self.eval = white_queen_dev
-            self._idx = 8
-        else:
-            self.eval = black_queen_dev
-            self._idx = 9
+    __slots__ = ()
+    _worth = 900
+    _names = ('queen', 'queen')
+    _indices = (8, 9)
+    _evals = (white_queen_dev, black_queen_dev)
 
     def criteria(self, x, y):
         """Return true if move to (x, y) fulfills criteria for specific piece based on current position and piece itself
@@ -212,16 +203,11 @@ class Queen(Piece):
 
 class King(Piece):
 
-    def __init__(self, xpos, ypos, color):
-        super().__init__(xpos, ypos, color)
-        self._worth = 20000
-        self._name = 'king'
-        if color == 1:
-            self.eval = white_king_dev
-            self._idx = 10
-        else:
-            self.eval = black_king_dev
-            self._idx = 11
+    __slots__ = ()
+    _worth = 20000
+    _names = ('king', 'king')
+    _indices = (10, 11)
+    _evals = (white_king_dev, black_king_dev)
 
     def king_castling(self, new_xpos, new_ypos):
         return (not self.get_was_moved()) and (abs(new_xpos - self._xpos) == 2) and (new_ypos == self._ypos)
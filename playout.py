@@ -0,0 +1,213 @@
+# playout.py: fast random playouts (simulations) for MCTS, on a light copy of the position
+
+#  A playout doesn't need the full rules of the board objects: it plays a few random moves and scores the result. The
+#  position is copied from a board snapshot (see Board.snapshot) into twelve bitboards, moves are generated
+#  pseudo-legally with the attack tables, and a move is only tested for legality once it is chosen (is the mover's king
+#  attacked after it?), instead of testing every move of every position. Castling is left out of playouts. Moves are
+#  chosen at random, biased toward captures of valuable pieces, since a playout of random quiet moves says little about
+#  a position. The final position is scored like Board.evaluate, with a table built once for every piece on every
+#  square.
+
+import random
+from attacks import knight_attacks, king_attacks, pawn_attacks, rook_attacks, bishop_attacks, squares
+from evaluation import piece_worth, midgame_tables, endgame_tables, phase_weights, phase_scale
+
+full_board = 2**64 - 1
+empty_square = 12  # the byte of an empty square in a snapshot
+
+
+def _build_square_values():
+    """Build the (material, midgame, endgame) values of each piece index on each square, from white's side"""
+    values = []
+    for idx in range(12):
+        sign = 1 if idx % 2 == 0 else -1
+        values.append([(sign * piece_worth[idx], sign * midgame_tables[idx][sq >> 3][sq & 7],
+                        sign * endgame_tables[idx][sq >> 3][sq & 7]) for sq in range(64)])
+    return values
+
+
+square_values = _build_square_values()
+
+
+class Playout:
+
+    def __init__(self, max_plies: int = 5, capture_bias: float = 0.75):
+        """A playout engine, created once and reused for every simulation of a search
+        :param max_plies: The number of random moves played before the position is scored
+        :param capture_bias: The chance of choosing a capture, when there is one, over any other move"""
+        self.max_plies = max_plies
+        self.capture_bias = capture_bias
+        self._bitboards = [0] * 12
+        self._occupied = [0, 0]  # [white pieces, black pieces]
+        self._squares = []  # piece index on each square (12 for empty)
+
+    def _load(self, snapshot: bytes) -> int:
+        """Copy a position into the playout engine
+        :param snapshot: The position (Board.snapshot())
+        :return: The side to move (0 for white, 1 for black)"""
+        self._squares = list(snapshot[:64])
+        b = self._bitboards = [0] * 12
+        for sq, idx in enumerate(self._squares):
+            if idx != empty_square:
+                b[idx] |= 1 << sq
+        self._occupied = [b[0] | b[2] | b[4] | b[6] | b[8] | b[10], b[1] | b[3] | b[5] | b[7] | b[9] | b[11]]
+        return snapshot[64]
+
+    def _moves(self, side: int):
+        """Generate the pseudo-legal moves of a side (castling left out, the king is never captured). Quiet moves are
+        kept as a bitboard of target squares per piece, so a random one can be picked without listing them all.
+        :return: A tuple with the list of [from square, target bitboard, number of targets] of the quiet moves and the
+        list of captures (from square, to square, victim worth)"""
+        b, sq_idx = self._bitboards, self._squares
+        own, enemy = self._occupied[side], self._occupied[1 - side] & ~b[11 - side]
+        occupied = own | self._occupied[1 - side]
+        empty = ~occupied & full_board
+        quiet, captures = [], []
+
+        step = 8 if side == 0 else -8
+        start_rank = 1 if side == 0 else 6
+        for frm in squares(b[side]):  # pawns
+            to = frm + step
+            if (empty >> to) & 1:
+                if frm >> 3 == start_rank and (empty >> (to + step)) & 1:
+                    quiet.append([frm, (1 << to) | (1 << (to + step)), 2])
+                else:
+                    quiet.append([frm, 1 << to, 1])
+            if pawn_attacks[side][frm] & enemy:
+                for to in squares(pawn_attacks[side][frm] & enemy):
+                    captures.append((frm, to, piece_worth[sq_idx[to]]))
+
+        for idx in range(2 + side, 12, 2):
+            for frm in squares(b[idx]):
+                if idx < 4:
+                    targets = knight_attacks[frm]
+                elif idx < 6:
+                    targets = bishop_attacks(frm, occupied)
+                elif idx < 8:
+                    targets = rook_attacks(frm, occupied)
+                elif idx < 10:
+                    targets = rook_attacks(frm, occupied) | bishop_attacks(frm, occupied)
+                else:
+                    targets = king_attacks[frm]
+                if targets & empty:
+                    quiet.append([frm, targets & empty, bin(targets & empty).count("1")])
+                if targets & enemy:
+                    for to in squares(targets & enemy):
+                        captures.append((frm, to, piece_worth[sq_idx[to]]))
+        return quiet, captures
+
+    def _make(self, frm: int, to: int) -> int:
+        """Make a move, promoting pawns to queens
+        :return: The piece index captured (12 for none), to undo the move with _unmake"""
+        b, occ, sq_idx = self._bitboards, self._occupied, self._squares
+        idx, captured = sq_idx[frm], sq_idx[to]
+        side = idx & 1
+        if captured != empty_square:
+            b[captured] ^= 1 << to
+            occ[1 - side] ^= 1 << to
+        b[idx] ^= 1 << frm
+        new = idx + 8 if idx <= 1 and (to < 8 or to >= 56) else idx
+        b[new] |= 1 << to
+        occ[side] ^= (1 << frm) | (1 << to)
+        sq_idx[frm], sq_idx[to] = empty_square, new
+        return captured
+
+    def _unmake(self, frm: int, to: int, idx: int, captured: int):
+        """Undo a move made with _make
+        :param idx: The piece index of the piece that moved (a pawn if it was promoted)
+        :param captured: The piece index returned by _make"""
+        b, occ, sq_idx = self._bitboards, self._occupied, self._squares
+        side = idx & 1
+        b[sq_idx[to]] ^= 1 << to
+        b[idx] |= 1 << frm
+        occ[side] ^= (1 << frm) | (1 << to)
+        if captured != empty_square:
+            b[captured] |= 1 << to
+            occ[1 - side] |= 1 << to
+        sq_idx[frm], sq_idx[to] = idx, captured
+
+    def _is_attacked(self, sq: int, side: int) -> bool:
+        """Return if a square is attacked by the pieces of side (0 for white, 1 for black)"""
+        b = self._bitboards
+        if knight_attacks[sq] & b[2 + side] or king_attacks[sq] & b[10 + side] or pawn_attacks[1 - side][sq] & b[side]:
+            return True
+        occupied = self._occupied[0] | self._occupied[1]
+        rooks = b[6 + side] | b[8 + side]
+        if rooks and rook_attacks(sq, occupied) & rooks:
+            return True
+        bishops = b[4 + side] | b[8 + side]
+        return bool(bishops and bishop_attacks(sq, occupied) & bishops)
+
+    def _random_move(self, side: int) -> bool:
+        """Make a random legal move for a side: a capture (chosen by the worth of the victim) with a chance of
+        capture_bias, otherwise any move. A chosen move is tested for legality, and another is chosen if it leaves the
+        king in check.
+        :return: True if a move was made, False if the side has no legal moves"""
+        quiet, captures = self._moves(side)
+        num_quiet = sum(n for _, _, n in quiet)
+        while num_quiet or captures:
+            if captures and (not num_quiet or random.random() < self.capture_bias):
+                i = random.choices(range(len(captures)), [worth for _, _, worth in captures])[0]
+                frm, to, _ = captures.pop(i)
+            else:
+                k = random.randrange(num_quiet)
+                for piece in quiet:  # find the piece of the k-th quiet move, then its target
+                    if k < piece[2]:
+                        break
+                    k -= piece[2]
+                frm, targets = piece[0], piece[1]
+                for _ in range(k):
+                    targets &= targets - 1
+                to = (targets & -targets).bit_length() - 1
+                piece[1] ^= 1 << to  # don't choose it again if it is illegal
+                piece[2] -= 1
+                num_quiet -= 1
+            idx = self._squares[frm]
+            captured = self._make(frm, to)
+            if not self._is_attacked(self._bitboards[10 + side].bit_length() - 1, 1 - side):
+                return True
+            self._unmake(frm, to, idx, captured)
+        return False
+
+    def play(self, snapshot: bytes) -> tuple:
+        """Play up to max_plies random moves from a position (the final position is kept until the next playout)
+        :param snapshot: The position to play from (Board.snapshot())
+        :return: A tuple with the team to move in the final position and whether it is checkmated"""
+        side = self._load(snapshot)
+        for _ in range(self.max_plies):
+            if not self._random_move(side):  # checkmate or stalemate
+                in_check = self._is_attacked(self._bitboards[10 + side].bit_length() - 1, 1 - side)
+                return (1 if side == 0 else -1), in_check
+            side ^= 1
+        return (1 if side == 0 else -1), False
+
+    def position(self) -> bytes:
+        """:return: The final position of the last playout, in the Board.to_array() format (for batch evaluation)"""
+        return bytes(self._squares)
+
+    def score(self, color: int) -> int:
+        """Score the final position of the last playout, as Board.evaluate would
+        :param color: The team of the side in question
+        :return: The score (positive if the team is winning)"""
+        material = midgame = endgame = phase = 0
+        for idx in range(12):
+            table, weight = square_values[idx], phase_weights[idx]
+            for sq in squares(self._bitboards[idx]):
+                m, mg, eg = table[sq]
+                material += m
+                midgame += mg
+                endgame += eg
+                phase += weight
+        scale = phase_scale[min(phase, len(phase_scale) - 1)]
+        score = material + ((midgame * scale + endgame * (256 - scale)) >> 8)
+        return score if color == 1 else -score
+
+    def run(self, snapshot: bytes, team: int) -> int:
+        """Run a playout and score it (checkmates are scored as in AI.scoring)
+        :param snapshot: The position to play from (Board.snapshot())
+        :param team: The team of the side in question
+        :return: The score of the final position (positive if the team is winning)"""
+        turn, mated = self.play(snapshot)
+        if mated:
+            return -999999 * turn * team
+        return self.score(team)
@@ -0,0 +1,42 @@
+# search_stats.py: node, cutoff, pruning and reduction counts of a search, to tune the search against match results
+
+
+class SearchStats:
+
+    def __init__(self):
+        """Counters for one search (reset() before each search)"""
+        self.nodes = 0  # positions searched by minimax
+        self.quiescence_nodes = 0  # positions searched by quiescence search
+        self.cutoffs = 0  # beta cutoffs of the move loop
+        self.first_move_cutoffs = 0  # beta cutoffs by the first move searched (a measure of the move ordering)
+        self.tt_cutoffs = 0  # positions cut off by the transposition table
+        self.null_cutoffs = 0  # positions cut off by null move pruning
+        self.reverse_futility_pruned = 0  # positions cut off by reverse futility pruning
+        self.futility_pruned = 0  # moves skipped by futility pruning
+        self.reductions = 0  # moves searched with a late move reduction
+        self.reduction_re_searches = 0  # reduced moves searched again to the full depth because they beat the bound
+        self.pvs_re_searches = 0  # moves searched again with the full window after the zero window search
+
+    def reset(self):
+        """Set all counters to zero"""
+        self.__init__()
+
+    def cutoff_rate(self) -> float:
+        """:return: The percentage of searched positions that had a beta cutoff"""
+        return 100 * self.cutoffs / self.nodes if self.nodes else 0.0
+
+    def first_move_cutoff_rate(self) -> float:
+        """:return: The percentage of beta cutoffs caused by the first move (above 90% means good move ordering)"""
+        return 100 * self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def report(self, sec: float = None):
+        """Print the counters of the search
+        :param sec: The time the search took in seconds, to print nodes per second"""
+        total = self.nodes + self.quiescence_nodes
+        print(f"nodes {self.nodes}  quiescence nodes {self.quiescence_nodes}", end="")
+        print(f"  nps {total / sec:.0f}" if sec else "")
+        print(f"cutoffs {self.cutoffs} ({self.cutoff_rate():.1f}% of nodes, {self.first_move_cutoff_rate():.1f}% by the "
+              f"first move)  tt {self.tt_cutoffs}  null move {self.null_cutoffs}")
+        print(f"pruned: reverse futility {self.reverse_futility_pruned}  futility {self.futility_pruned}")
+        print(f"reductions {self.reductions} ({self.reduction_re_searches} searched again)  "
+              f"pvs re-searches {self.pvs_re_searches}")
@@ -0,0 +1,69 @@
+# time_manager.py: splits a game clock (total time plus an increment per move) into a time budget for each move
+
+import time
+
+
+class SearchTimeout(Exception):
+
+    def __init__(self):
+        super().__init__("Search timeout: the time budget for the move ran out")
+
+
+class TimeManager:
+
+    def __init__(self, total_time: float = 300, increment: float = 0, expected_moves: int = 50,
+                 min_moves_to_go: int = 10, margin: float = 0.05):
+        """Keeps the AI's clock and gives each move a budget of the remaining time divided by the expected number of
+        moves left, plus most of the increment
+        :param total_time: The time on the clock at the start of the game in seconds
+        :param increment: The time added to the clock after each move in seconds
+        :param expected_moves: The number of moves (per team) a game is expected to last
+        :param min_moves_to_go: The fewest moves the remaining time is divided between, however long the game runs
+        :param margin: The time in seconds always left on the clock (for the overhead outside the search)"""
+        self.remaining = total_time
+        self.increment = increment
+        self.expected_moves = expected_moves
+        self.min_moves_to_go = min_moves_to_go
+        self.margin = margin
+        self._start = None  # start time of the current move
+        self._budget = 0
+        self._deadline = None  # search aborts after this time (None when no move is being searched)
+
+    def start(self, move_count: int = 0) -> float:
+        """Start the clock for a move
+        :param move_count: The number of moves (plies) played in the game so far
+        :return: The time budget for the move in seconds"""
+        moves_to_go = max(self.min_moves_to_go, self.expected_moves - move_count // 2)
+        budget = self.remaining / moves_to_go + 0.75 * self.increment
+        self._budget = max(0.0, min(budget, self.remaining - self.margin))
+        self._start = time.time()
+        self._deadline = self._start + self._budget
+        return self._budget
+
+    def stop(self) -> float:
+        """Stop the clock after a move: take the time used off the clock and add the increment
+        :return: The time used for the move in seconds"""
+        used = self.elapsed()
+        self.remaining += self.increment - used
+        self._start = None
+        self._deadline = None
+        return used
+
+    def elapsed(self) -> float:
+        """:return: The time spent on the current move so far in seconds"""
+        return 0.0 if self._start is None else time.time() - self._start
+
+    def time_left(self) -> float:
+        """:return: The time left of the current move's budget in seconds"""
+        return self._budget - self.elapsed()
+
+    def can_start_iteration(self) -> bool:
+        """Each iteration of iterative deepening takes several times longer than the one before, so don't start one
+        that won't finish: only start it while less than half of the budget is used
+        :return: True if there is time for another iteration"""
+        return self.elapsed() < self._budget / 2
+
+    def check(self):
+        """Called regularly during a search: abort it (raise SearchTimeout) once the budget for the move is used up"""
+        if self._deadline is not None and time.time() > self._deadline:
+            raise SearchTimeout()
@@ -0,0 +1,183 @@
+# transposition.py: a fixed-size transposition table keyed by the board's zobrist hash
+
+#  Each bucket holds two entries: the first is depth-preferred (only replaced by an equal or deeper search of the
+#  position, or by any search once the entry is from an older search), the second is always replaced.
+
+import ctypes
+import multiprocessing
+
+# bound types: how the stored score relates to the true score of the position
+EXACT = 0  # the score is exact (it was inside the alpha-beta window)
+LOWER_BOUND = 1  # the search failed high: the true score is at least the stored score
+UPPER_BOUND = 2  # the search failed low: the true score is at most the stored score
+
+entry_size = 200  # estimated bytes per stored entry (tuple, key, score and move objects, and its slot)
+score_limit = 2**31 - 1  # scores stored in the shared table are clipped to 32 bits
+
+
+class TranspositionTable:
+
+    def __init__(self, size_mb: float = 16):
+        """A transposition table stores, for each position (zobrist hash), the depth it was searched to, its score, the
+        bound type of the score and the best move found. Memory use is capped at about size_mb megabytes.
+        :param size_mb: The memory cap of the table in megabytes"""
+        self._num_buckets = max(1, int(size_mb * 2**20) // (2 * entry_size))
+        self._table = None  # allocated on the first store: [depth-preferred, always-replace] * number of buckets
+        self._age = 0  # search generation, so entries from old searches can be replaced
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __len__(self):
+        """:return: The number of entries stored"""
+        if self._table is None:
+            return 0
+        return len(self._table) - self._table.count(None)
+
+    def get_size(self) -> int:
+        """:return: The maximum number of entries"""
+        return 2 * self._num_buckets
+
+    def new_search(self):
+        """Start a new search: entries stored from now on replace the depth-preferred entries of earlier searches"""
+        self._age += 1
+
+    def clear(self):
+        """Remove all entries"""
+        self._table = None
+        self._age = 0
+
+    def probe(self, key: int):
+        """Look up a position
+        :param key: The zobrist hash of the position
+        :return: (depth, score, bound type, best move) if the position is stored, None otherwise"""
+        self.probes += 1
+        if self._table is None:
+            return None
+        i = 2 * (key % self._num_buckets)
+        for entry in (self._table[i], self._table[i + 1]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1], entry[2], entry[3], entry[4]
+        return None
+
+    def store(self, key: int, depth: int, score, bound: int, best_move):
+        """Store the result of searching a position
+        :param key: The zobrist hash of the position
+        :param depth: The depth the position was searched to
+        :param score: The score found
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND
+        :param best_move: The best move found, or None"""
+        if self._table is None:
+            self._table = [None] * (2 * self._num_buckets)
+        self.stores += 1
+        i = 2 * (key % self._num_buckets)
+        entry = (key, depth, score, bound, best_move, self._age)
+
+        old = self._table[i]
+        if old is None or old[0] == key or depth >= old[1] or old[5] != self._age:
+            if old is not None and old[0] != key:  # keep the replaced entry in the always-replace slot
+                self._table[i + 1] = old
+            self._table[i] = entry
+        else:
+            self._table[i + 1] = entry
+
+
+class SharedTranspositionTable:
+
+    def __init__(self, size_mb: float = 16, array=None, age: int = 0):
+        """A transposition table in shared memory, for the worker processes of a parallel search (same interface as
+        TranspositionTable). Each entry is two 64-bit words: the packed data (score, depth, bound, move and age) and the
+        key xor the data. The words are written without a lock, so an entry written by two processes at once is
+        detected when it is read (the key no longer matches) and ignored.
+        :param size_mb: The size of the table in megabytes (if array is None)
+        :param array: The shared array of an existing table (get_array()), to use the same table in another process
+        :param age: The search generation (new_search())"""
+        if array is None:
+            array = multiprocessing.Array(ctypes.c_uint64, 4 * max(1, int(size_mb * 2**20) // 32), lock=False)
+        self._table = array
+        self._num_buckets = len(array) // 4  # two entries per bucket, two words per entry
+        self._age = age
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __len__(self):
+        """:return: The number of entries stored"""
+        return sum(1 for i in range(1, len(self._table), 2) if self._table[i])
+
+    def get_size(self) -> int:
+        """:return: The maximum number of entries"""
+        return 2 * self._num_buckets
+
+    def get_array(self):
+        """:return: The shared array holding the table"""
+        return self._table
+
+    def get_age(self) -> int:
+        """:return: The search generation"""
+        return self._age
+
+    def new_search(self):
+        """Start a new search: entries stored from now on replace the depth-preferred entries of earlier searches"""
+        self._age = (self._age + 1) & 0xFF
+
+    def clear(self):
+        """Remove all entries"""
+        ctypes.memset(self._table, 0, ctypes.sizeof(self._table))
+        self._age = 0
+
+    @staticmethod
+    def _pack(depth: int, score, bound: int, best_move, age: int) -> int:
+        """Pack an entry into 63 bits: score (32 bits, offset so the data is never 0), depth (8), bound (2), move (13:
+        a flag, from square and to square) and age (8)"""
+        score = max(-score_limit, min(score_limit, int(score)))
+        move = 0
+        if best_move is not None:
+            (x1, y1), (x2, y2) = best_move
+            move = (1 << 12) | ((y1 * 8 + x1) << 6) | (y2 * 8 + x2)
+        return (score + 2**31) | (min(depth, 255) << 32) | (bound << 40) | (move << 42) | (age << 55)
+
+    @staticmethod
+    def _unpack(data: int):
+        """:return: (depth, score, bound type, best move, age) of packed entry data"""
+        move = (data >> 42) & 0x1FFF
+        best_move = None
+        if move:
+            frm, to = (move >> 6) & 63, move & 63
+            best_move = ((frm & 7, frm >> 3), (to & 7, to >> 3))
+        return (data >> 32) & 0xFF, (data & 0xFFFFFFFF) - 2**31, (data >> 40) & 3, best_move, (data >> 55) & 0xFF
+
+    def probe(self, key: int):
+        """Look up a position
+        :param key: The zobrist hash of the position
+        :return: (depth, score, bound type, best move) if the position is stored, None otherwise"""
+        self.probes += 1
+        i = 4 * (key % self._num_buckets)
+        for j in (i, i + 2):
+            data = self._table[j + 1]
+            if data and self._table[j] ^ data == key:
+                self.hits += 1
+                return self._unpack(data)[:4]
+        return None
+
+    def store(self, key: int, depth: int, score, bound: int, best_move):
+        """Store the result of searching a position (same replacement scheme as TranspositionTable)
+        :param key: The zobrist hash of the position
+        :param depth: The depth the position was searched to
+        :param score: The score found
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND
+        :param best_move: The best move found, or None"""
+        self.stores += 1
+        i = 4 * (key % self._num_buckets)
+        data = self._pack(depth, score, bound, best_move, self._age)
+
+        old_data = self._table[i + 1]
+        old_key = self._table[i] ^ old_data
+        old_depth, _, _, _, old_age = self._unpack(old_data)
+        if not old_data or old_key == key or depth >= old_depth or old_age != self._age:
+            if old_data and old_key != key:  # keep the replaced entry in the always-replace slot
+                self._table[i + 2], self._table[i + 3] = old_key ^ old_data, old_data
+            self._table[i], self._table[i + 1] = key ^ data, data
+        else:
+            self._table[i + 2], self._table[i + 3] = key ^ data, data
@@ -0,0 +1,192 @@
+# tree_parallel.py: tree-parallel MCTS: several workers grow one shared tree, spread over its branches by virtual loss
+
+#  Selecting a leaf, expanding it and backpropagating are quick updates of the shared tree, done one worker at a time.
+#  The slow part of an iteration, the simulation (making the leaf's moves, generating its legal moves to expand it and
+#  the playout), is done by the workers in parallel, each with its own board replica and playout engine. A worker
+#  adds a visit and a virtual loss to every node on its way down, so the other workers choose other branches until its
+#  result is in (see MCTSTree.select_leaf).
+#  On a free-threaded (no GIL) build of Python the workers are threads of this process, sharing the tree under a lock.
+#  Elsewhere threads would run one at a time, so the workers are processes instead and this process serves the tree
+#  to them: it sends each worker the moves to a leaf and adds the results it sends back.
+#  Run this module to measure the iterations per second for 1, 2, ... workers.
+
+import sys
+import time
+import random
+import argparse
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from board import Board
+from bitboard import BitBoard
+from mcts_tree import MCTSTree, root_node
+from playout import Playout
+
+free_threaded = not getattr(sys, "_is_gil_enabled", lambda: True)()  # sys._is_gil_enabled is new in Python 3.13
+boards = {"board": Board, "bitboard": BitBoard}
+
+
+def legal_move_list(board) -> list:
+    """:return: The legal moves of the board as a list of ((x1, y1), (x2, y2)) (like AI.format_legal_moves)"""
+    return [(pos, to) for pos, moves in board.legal_moves().items() for to in moves]
+
+
+def simulate_leaf(board, playout: Playout, team: int, path: list, expand: bool) -> tuple:
+    """Run the simulation of an iteration on a worker's board replica (at the root position, where it is left)
+    :param board: The worker's board
+    :param playout: The worker's playout engine
+    :param team: The team of the AI
+    :param path: The moves from the root to the leaf
+    :param expand: whether to expand the leaf: its legal moves are generated and a random child is simulated
+    :return: A tuple with the legal moves of the leaf (None if not expanded), the index of the simulated child in them
+    (None if not expanded) and the result of the simulation"""
+    for move in path:
+        board.move_piece(move[0], move[1], check=False)
+    moves, child = None, None
+    if expand:
+        moves = legal_move_list(board)
+        if moves:
+            child = random.randrange(len(moves))
+            board.move_piece(moves[child][0], moves[child][1], check=False)
+    result = playout.run(board.snapshot(), team)
+    for _ in range(len(path) + (child is not None)):
+        board.undo_move()
+    return moves, child, result
+
+
+def add_result(tree: MCTSTree, leaf: int, moves, child, result, virtual_loss: float):
+    """Add the result of simulate_leaf to the tree: expand the leaf (unless another worker did meanwhile), then
+    backpropagate the result and take back the virtual loss"""
+    if moves and tree.is_leaf(leaf):
+        node = tree.expand(leaf, moves, child)
+        tree.visits[node] += 1
+        tree.totals[node] += result
+    tree.backpropagate_virtual(leaf, result, virtual_loss)
+
+
+def thread_worker(tree: MCTSTree, lock, board_type, snapshot: bytes, team: int, deadline: float, virtual_loss: float,
+                  counts: list, worker_id: int):
+    """Run iterations on the shared tree in a thread until the deadline, counting them in counts[worker_id]"""
+    board = board_type()
+    board.restore(snapshot)
+    playout = Playout()
+    while time.time() < deadline:
+        with lock:
+            leaf, expand = tree.select_leaf(virtual_loss)
+            path = tree.path(leaf)
+        moves, child, result = simulate_leaf(board, playout, team, path, expand)
+        with lock:
+            add_result(tree, leaf, moves, child, result, virtual_loss)
+        counts[worker_id] += 1
+
+
+def process_worker(conn, board_type, snapshot: bytes, team: int, seed: int):
+    """Run simulations in a worker process for the tree server: receive (path, expand) and send back the result of
+    simulate_leaf, until None is received"""
+    random.seed(seed)
+    board = board_type()
+    board.restore(snapshot)
+    playout = Playout()
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        conn.send(simulate_leaf(board, playout, team, *job))
+
+
+def thread_search(tree: MCTSTree, board, team: int, deadline: float, num_workers: int, virtual_loss: float) -> int:
+    """Grow the tree with worker threads until the deadline
+    :return: The number of iterations"""
+    lock = threading.Lock()
+    counts = [0] * num_workers
+    threads = [threading.Thread(target=thread_worker, args=(tree, lock, type(board), board.snapshot(), team,
+                                                           deadline, virtual_loss, counts, i))
+               for i in range(num_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+
+def process_search(tree: MCTSTree, board, team: int, deadline: float, num_workers: int, virtual_loss: float) -> int:
+    """Grow the tree with worker processes until the deadline, serving the tree to them from this process
+    :return: The number of iterations"""
+    snapshot = board.snapshot()
+    conns, workers = [], []
+    for _ in range(num_workers):
+        conn, worker_conn = multiprocessing.Pipe()
+        worker = multiprocessing.Process(target=process_worker, daemon=True,
+                                         args=(worker_conn, type(board), snapshot, team, random.getrandbits(32)))
+        worker.start()
+        conns.append(conn)
+        workers.append(worker)
+
+    jobs = {}  # {key=connection, val=leaf the worker is simulating}
+    for conn in conns:
+        leaf, expand = tree.select_leaf(virtual_loss)
+        conn.send((tree.path(leaf), expand))
+        jobs[conn] = leaf
+    iterations = 0
+    while jobs:
+        for conn in wait(list(jobs)):
+            add_result(tree, jobs.pop(conn), *conn.recv(), virtual_loss)
+            iterations += 1
+            if time.time() < deadline:  # give the worker its next leaf
+                leaf, expand = tree.select_leaf(virtual_loss)
+                conn.send((tree.path(leaf), expand))
+                jobs[conn] = leaf
+
+    for conn in conns:
+        conn.send(None)
+    for worker in workers:
+        worker.join()
+    return iterations
+
+
+def search(tree: MCTSTree, board, team: int, deadline: float, num_workers: int, virtual_loss: float,
+           threads: bool = None) -> int:
+    """Grow the tree (its root must be expanded) from the board's position with several workers until the deadline
+    :param tree: The tree
+    :param board: The board at the root position (it isn't changed)
+    :param team: The team of the AI
+    :param deadline: The time (time.time()) to stop searching
+    :param num_workers: The number of workers
+    :param virtual_loss: The virtual loss added to the nodes a worker selects (see MCTSTree.select_leaf)
+    :param threads: whether the workers are threads or processes, None for threads only on a free-threaded build
+    :return: The number of iterations"""
+    if threads is None:
+        threads = free_threaded
+    if threads:
+        return thread_search(tree, board, team, deadline, num_workers, virtual_loss)
+    return process_search(tree, board, team, deadline, num_workers, virtual_loss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the iterations per second of tree-parallel MCTS")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="most workers to measure")
+    parser.add_argument("--seconds", type=float, default=5, help="time to search for each number of workers")
+    parser.add_argument("--board", choices=list(boards), default="bitboard", help="board implementation to use")
+    parser.add_argument("--threads", action="store_true", help="use threads even without a free-threaded build")
+    parser.add_argument("--virtual-loss", type=float, default=500, help="virtual loss in centipawns")
+    args = parser.parse_args()
+
+    board = boards[args.board]()
+    board.start_game()
+    threads = args.threads or free_threaded
+    print(f"{'threads' if threads else 'processes'} (free-threaded build: {free_threaded})")
+    print("Workers   Iterations      It/sec  Speedup")
+    base = None
+    for num_workers in range(1, args.workers + 1):
+        tree = MCTSTree()
+        tree.expand(root_node, legal_move_list(board))
+        start = time.time()
+        iterations = search(tree, board, board.get_current_turn(), start + args.seconds, num_workers,
+                            args.virtual_loss, threads)
+        rate = iterations / (time.time() - start)
+        base = base or rate
+        print(f"{num_workers:7d} {iterations:12d} {rate:11.0f} {rate / base:8.2f}")
+
+
+if __name__ == "__main__":
+    main()